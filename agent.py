@@ -4,6 +4,36 @@ import random
 from enum import Enum
 from collections import deque # For efficient agent history logs
 
+# --- VVV Static Prompt Sections (built once, not per call) VVV ---
+# These rule/instruction blocks never change between calls, so pre-joining them
+# avoids re-concatenating the same multi-line text for every LLM request.
+_PLANNING_RULES = "".join([
+    "**Goal & Planning Rules:**\n",
+    "1. Goal: Ensure long-term SURVIVAL. Balance resources, safety/strength (grouping), eliminating competition, and exploration.\n",
+    "2. Movement: Use MOVE <Direction> to reach targets step-by-step.\n",
+    "3. Resource PRECONDITION: MUST be AT the resource location to COLLECT.\n",
+    "4. Grouping PRECONDITION: MUST be adjacent (Dist 1) and UNGROUPED to FORM/ACCEPT group. You CANNOT accept if already grouped.\n",
+    "5. Evaluating Group Requests/Joining: If ACCEPT_GROUP_FROM or FORM_GROUP_WITH is available:\n",
+    "   - BENEFITS: Increases strength/defense, **gain knowledge of new resource locations from others**.\n",
+    "   - CONSIDER: Requester/Target HP (Perception)? Your own status (Alone/Low HP)?\n",
+    "   - ALTERNATIVE: ATTACK weak agents to eliminate resource competition.\n",
+    "   - CHOICE: Decide whether to ACCEPT, ATTACK, or IGNORE (choose IDLE/other plan).\n",
+    "6. Combat PRECONDITION: ATTACK only if target is nearby and strategically sound (consider HP of self vs target).\n",
+    "7. Planning: Choose a high-level plan. System handles step-by-step movement.\n",
+])
+
+_PLAN_OUTPUT_INSTRUCTIONS = "".join([
+    'Evaluate your situation using Perception and Rules. Choose the best plan for SURVIVAL.\n',
+    'Think and rationalize about your best course of action. Be detailed and think it through.\n',
+    'Next, output JSON like: {"rationale:" <rationale_for_choosing_plan>, "plan": "PLAN_NAME", "target": <target_details_or_null>}\n',
+    'Examples: ',
+    '{"rationale": "This agent is starving and must find resources for survival.", "plan": "GO_TO_RESOURCE", "target": [5, 4]},',
+    '{"rationale": "This agent is currently solo. The shared knowledge and strength of a group will increase chances of survival.", "plan": "ACCEPT_GROUP_FROM", "target": 1},',
+    '{"rationale": "This agent is weak and has significant resources. Instead of grouping with it, it will be preferable to attack it and take its resources for my own survival.", "plan": "ATTACK_AGENT", "target": 1}, {"plan": "IDLE"}\n',
+    'Your plan JSON: ',
+])
+# --- ^^^ Static Prompt Sections ^^^ ---
+
 class Agent:
     """Represents an agent in the simulation."""
     def __init__(self, id, x, y, agent_llm_config):
@@ -36,7 +66,7 @@ class Agent:
         self.history_log = deque(maxlen=AGENT_MAX_LOG_ENTRIES)
 
         self.llm_config = agent_llm_config
-        self.current_plan = {'plan': PlanType.IDLE, 'target': None, 'path': None}
+        self.current_plan = Plan()
         self.is_waiting_for_llm = False # Still useful to prevent spamming requests
         
     
@@ -101,20 +131,18 @@ class Agent:
         # --- ^^^ Also clear flag ^^^ ---
 
 
-    def set_new_plan(self, plan_dict):
-        """Updates the agent's plan and logs it, clearing wait flags."""
+    def set_new_plan(self, new_plan):
+        """Updates the agent's plan (a Plan record) and logs it, clearing wait flags."""
         if not self.is_alive(): return
-        # Validate plan_dict has expected keys
-        if 'plan' not in plan_dict:
-             log_agent_event(self.id, f"Invalid plan dict passed to set_new_plan: {plan_dict}", level=logging.ERROR)
+        # Validate the expected record type
+        if not isinstance(new_plan, Plan):
+             log_agent_event(self.id, f"Invalid plan passed to set_new_plan: {new_plan!r}", level=logging.ERROR)
              # Default to IDLE to prevent errors
-             self.current_plan = {'plan': PlanType.IDLE, 'target': None, 'path': None}
+             self.current_plan = Plan()
         else:
-             self.current_plan = plan_dict
-             if 'target' not in self.current_plan: self.current_plan['target'] = None
-             if 'path' not in self.current_plan: self.current_plan['path'] = None
+             self.current_plan = new_plan
 
-        log_agent_event(self.id, f"Set Plan: {self.current_plan['plan'].name}, Target: {self.current_plan.get('target')}", self)
+        log_agent_event(self.id, lambda: f"Set Plan: {self.current_plan.plan.name}, Target: {self.current_plan.target}", self)
         self.is_waiting_for_llm = False # Got a plan, no longer waiting
 
 
@@ -122,7 +150,7 @@ class Agent:
     def get_state_for_llm(self, grid_manager, agent_manager, group_manager, resource_manager):
         """Generates the context prompt string for the LLM, with enhanced guidance."""
 
-        is_group_decision = self.group_request_pending_decision or self.current_plan['plan'] == PlanType.RESPOND_TO_GROUP_REQUEST
+        is_group_decision = self.group_request_pending_decision or self.current_plan.plan == PlanType.RESPOND_TO_GROUP_REQUEST
         requester_id = None
         requester_agent = None
         if is_group_decision and self.pending_group_requests_from:
@@ -191,9 +219,9 @@ class Agent:
 
             # Handle visible Resources
             elif isinstance(obj, tuple) and obj[0] == 'Resource':
-                res_info = obj[1] # Get the resource details dict
-                res_type = res_info.get('type', 'Unknown')
-                res_quantity = res_info.get('quantity', 0)
+                res_info = obj[1] # Get the ResourceDeposit record
+                res_type = res_info.type
+                res_quantity = res_info.quantity
                 # Describe quantity qualitatively
                 qty_desc = "High" if res_quantity > RESOURCE_MAX_QUANTITY * 0.6 else ("Medium" if res_quantity > RESOURCE_MAX_QUANTITY * 0.2 else "Low")
                 # Format resource string including estimated steps (distance)
@@ -263,21 +291,7 @@ class Agent:
 
         else:
             # --- VVV MODIFIED GUIDANCE FOR PLANS VVV ---
-            context += "**Goal & Planning Rules:**\n"
-            context += "1. Goal: Ensure long-term SURVIVAL. Balance resources, safety/strength (grouping), eliminating competition, and exploration.\n"
-            context += "2. Movement: Use MOVE <Direction> to reach targets step-by-step.\n"
-            context += "3. Resource PRECONDITION: MUST be AT the resource location to COLLECT.\n"
-            context += "4. Grouping PRECONDITION: MUST be adjacent (Dist 1) and UNGROUPED to FORM/ACCEPT group. You CANNOT accept if already grouped.\n"
-
-            # 5. Added Rule - Evaluating Group Requests:
-            context += "5. Evaluating Group Requests/Joining: If ACCEPT_GROUP_FROM or FORM_GROUP_WITH is available:\n"
-            context += "   - BENEFITS: Increases strength/defense, **gain knowledge of new resource locations from others**.\n" # <<< Benefit added
-            context += "   - CONSIDER: Requester/Target HP (Perception)? Your own status (Alone/Low HP)?\n"
-            context += "   - ALTERNATIVE: ATTACK weak agents to eliminate resource competition.\n"
-            context += "   - CHOICE: Decide whether to ACCEPT, ATTACK, or IGNORE (choose IDLE/other plan).\n"
-
-            context += "6. Combat PRECONDITION: ATTACK only if target is nearby and strategically sound (consider HP of self vs target).\n"
-            context += "7. Planning: Choose a high-level plan. System handles step-by-step movement.\n"
+            context += _PLANNING_RULES # Static rules, pre-joined at module load
             # --- ^^^ END OF REVISED RULES ^^^ ---
 
             # --- Dynamically List Possible Plans with Context ---
@@ -329,14 +343,7 @@ class Agent:
             context += f"**Available Plans NOW:** {possible_plans_str}\n"
 
             # --- Final Instruction ---
-            context += 'Evaluate your situation using Perception and Rules. Choose the best plan for SURVIVAL.\n'
-            context += 'Think and rationalize about your best course of action. Be detailed and think it through.\n'
-            context += 'Next, output JSON like: {"rationale:" <rationale_for_choosing_plan>, "plan": "PLAN_NAME", "target": <target_details_or_null>}\n'
-            context += 'Examples: '
-            context += '{"rationale": "This agent is starving and must find resources for survival.", "plan": "GO_TO_RESOURCE", "target": [5, 4]},'
-            context += '{"rationale": "This agent is currently solo. The shared knowledge and strength of a group will increase chances of survival.", "plan": "ACCEPT_GROUP_FROM", "target": 1},'
-            context += '{"rationale": "This agent is weak and has significant resources. Instead of grouping with it, it will be preferable to attack it and take its resources for my own survival.", "plan": "ATTACK_AGENT", "target": 1}, {"plan": "IDLE"}\n'
-            context += 'Your plan JSON: '
+            context += _PLAN_OUTPUT_INSTRUCTIONS # Static instructions + examples, pre-joined
 
         return context
 
@@ -1,11 +1,15 @@
 from constants import *
 from helper import *
 from agent import Agent
+import numpy as np
+import queue # For queue.Full from the bounded LLM request ring
 import random
 
 class AgentManager:
     def __init__(self, grid_manager, available_llm_configs): # Needs sim ref for queues
         self.agents = {}
+        self._agent_ids = [] # Cached id list, maintained by create/remove - avoids per-tick list(keys()) copies
+        self._agents_by_pos = {} # (x, y) -> Agent index for O(1) hit-testing, synced on create/move/remove
         self.next_agent_id = 0
         self.grid_manager = grid_manager
         self.combat_manager = None # Set by Simulation
@@ -29,6 +33,8 @@ class AgentManager:
             agent = Agent(agent_id, pos[0], pos[1], agent_config)
 
             self.agents[agent_id] = agent
+            self._agent_ids.append(agent_id)
+            self._agents_by_pos[pos] = agent
             self.grid_manager.place_object(agent, pos[0], pos[1])
             self.next_agent_id += 1
             return agent
@@ -46,10 +52,54 @@ class AgentManager:
         """Returns a list of all current agent objects."""
         return list(self.agents.values())
 
+    def get_render_arrays(self):
+        """Returns (agents, xs, ys, hp_ratios, res_levels) for the renderer.
+
+        Structure-of-arrays mirror: int32 position arrays plus float32 HP
+        ratios and resource levels, so per-agent pixel and bar math runs
+        vectorized while the Agent objects remain the source of truth for
+        everything else. Rebuilt per call since the values change every tick.
+        """
+        agents = [a for a in self.agents.values() if a.is_alive()]
+        n = len(agents)
+        xs = np.fromiter((a.x for a in agents), dtype=np.int32, count=n)
+        ys = np.fromiter((a.y for a in agents), dtype=np.int32, count=n)
+        hp_ratios = (np.fromiter((a.hp for a in agents), dtype=np.float32, count=n)
+                     / np.fromiter((a.max_hp for a in agents), dtype=np.float32, count=n))
+        res_levels = np.fromiter((a.resource_level for a in agents), dtype=np.float32, count=n)
+        return agents, xs, ys, hp_ratios, res_levels
+
+    def get_agent_at(self, x, y):
+        """Returns the live agent occupying cell (x, y), or None - O(1).
+
+        Uses the incrementally-maintained position index instead of scanning
+        the grid cell's object list.
+        """
+        agent = self._agents_by_pos.get((x, y))
+        return agent if agent is not None and agent.is_alive() else None
+
+    def _on_agent_moved(self, agent, old_pos):
+        """Keeps the position index in sync after a successful grid move."""
+        if self._agents_by_pos.get(old_pos) is agent:
+            del self._agents_by_pos[old_pos]
+        self._agents_by_pos[(agent.x, agent.y)] = agent
+
+    def get_agent_ids(self):
+        """Returns the cached list of current agent IDs.
+
+        The same list object is maintained incrementally across ticks - do
+        not mutate it. Plan execution never adds/removes agents (deaths are
+        processed afterwards by handle_deaths), so it is safe to iterate.
+        """
+        return self._agent_ids
+
     def remove_agent(self, agent_id, group_manager):
         """Removes an agent from the simulation (e.g., upon death)."""
         agent = self.agents.pop(agent_id, None) # Remove from dict, get object if found
         if agent:
+            self._agent_ids.remove(agent_id) # Keep cached id list in sync
+            if self._agents_by_pos.get((agent.x, agent.y)) is agent:
+                del self._agents_by_pos[(agent.x, agent.y)] # Keep position index in sync
             log_agent_event(agent_id, "Removed from simulation (died/despawned).", agent_ref=None) # Can't use agent ref now
             self.grid_manager.remove_object(agent, agent.x, agent.y) # Remove from grid
             if agent.group_id:
@@ -79,8 +129,14 @@ class AgentManager:
 
     # Modified to accept request_queue from Simulation._tick
     def initiate_llm_requests(self, group_manager, resource_manager, current_time_step, request_queue):
-        """Checks agents and queues requests (agent_id, context) for those needing plans."""
+        """Checks agents and queues batched requests for those needing plans.
+
+        Requests are collected per LLM config id and flushed as one queue item
+        per config per tick, so each endpoint sees a single batch instead of
+        one queue hand-off per agent.
+        """
         self.update_pending_requests() # Update request statuses first
+        batches = {} # config id -> [(agent_id, context), ...] collected this tick
         for agent_id, agent in list(self.agents.items()):
              if agent.is_alive() and not agent.in_combat and agent.llm_config: # Check if agent has config
                  agent.simulation_time_step = current_time_step
@@ -90,18 +146,17 @@ class AgentManager:
                  if agent.group_request_pending_decision and not agent.is_waiting_for_llm:
                      # Immediately queue a focused group decision request
                      context = agent.get_state_for_llm(self.grid_manager, self, group_manager, resource_manager) # Method now generates focused prompt
-                     request_data = (agent.id, context)
-                     request_queue.put(request_data)
+                     batches.setdefault(agent.llm_config.get('id'), []).append((agent.id, context))
 
                      # Update agent state
                      agent.is_waiting_for_llm = True
                      agent.group_request_pending_decision = False # Decision is now pending LLM response
-                     agent.current_plan = {'plan': PlanType.RESPOND_TO_GROUP_REQUEST, 'target': None, 'path': None} # Set specific plan state
+                     agent.current_plan = Plan(PlanType.RESPOND_TO_GROUP_REQUEST) # Set specific plan state
 
                      log_agent_event(agent.id, "Queued LLM group decision request.", agent, level=logging.INFO)
                      llm_request_queued = True # Mark that a request was queued
 
-                 if agent.current_plan['plan'] == PlanType.EXPLORE:
+                 if agent.current_plan.plan == PlanType.EXPLORE:
                     # Check current perception (memory updated at start of tick)
                     # What constitutes "something significant"? Another agent or a known resource nearby.
                     nearby_significant = False
@@ -125,22 +180,21 @@ class AgentManager:
 
                     if nearby_significant:
                         # Interrupt explore: set plan to IDLE to force LLM re-evaluation next tick
-                        agent.set_new_plan({'plan': PlanType.IDLE, 'target': None, 'path': None})
+                        agent.set_new_plan(Plan())
                         # No need to queue LLM request here, the IDLE state will trigger it below if frequency allows
 
 
                  # --- Normal Plan Request Logic (only if group decision wasn't queued) ---
                  if not llm_request_queued:
 
-                     needs_new_plan = (agent.current_plan['plan'] == PlanType.IDLE)
+                     needs_new_plan = (agent.current_plan.plan == PlanType.IDLE)
                      time_to_decide = (agent.ticks_since_last_llm_decision >= LLM_DECISION_FREQUENCY)
                      can_request = not agent.is_waiting_for_llm
 
                      if needs_new_plan and time_to_decide and can_request:
-                         agent.ticks_since_last_llm_decision = 0 # Reset counter
                          context = agent.get_state_for_llm(self.grid_manager, self, group_manager, resource_manager) # Normal prompt
-                         request_data = (agent.id, context)
-                         request_queue.put(request_data)
+                         batches.setdefault(agent.llm_config.get('id'), []).append((agent.id, context))
+                         agent.ticks_since_last_llm_decision = 0 # Reset counter
                          agent.is_waiting_for_llm = True
                          # Optionally set plan to WAITING_LLM? or keep IDLE? Keep IDLE is simpler.
                          log_agent_event(agent.id, "Queued LLM plan request (Idle trigger).", agent, level=logging.DEBUG)
@@ -149,6 +203,23 @@ class AgentManager:
                          # Increment counter if no request was queued this tick for this agent
                          agent.ticks_since_last_llm_decision += 1
 
+        # --- Flush one batch per config so each endpoint sees a single queue item per tick ---
+        for config_id, batch in batches.items():
+            try:
+                request_queue.put_nowait(batch)
+            except queue.Full:
+                # Worker saturated - revert the batch's agents so they retry next tick.
+                logging.warning(f"LLM request queue full. Deferring batch of {len(batch)} requests for config '{config_id}'.")
+                for batch_agent_id, _ in batch:
+                    batch_agent = self.agents.get(batch_agent_id)
+                    if not batch_agent: continue
+                    batch_agent.is_waiting_for_llm = False
+                    if batch_agent.current_plan.plan == PlanType.RESPOND_TO_GROUP_REQUEST:
+                        # Restore the pending-decision state so it is re-asked next tick
+                        batch_agent.group_request_pending_decision = True
+                        batch_agent.current_plan = Plan()
+                    else:
+                        batch_agent.ticks_since_last_llm_decision = LLM_DECISION_FREQUENCY # Eligible again next tick
 
 
     def request_decisions(self, group_manager, resource_manager, current_time_step):
@@ -204,8 +275,8 @@ class AgentManager:
         if not agent or not agent.is_alive() or agent.in_combat: return
 
         plan_info = agent.current_plan
-        plan_type = plan_info['plan']
-        target = plan_info.get('target')
+        plan_type = plan_info.plan
+        target = plan_info.target
 
         # --- VVV Handle Waiting States VVV ---
         # If waiting for any LLM response or group response, maybe just idle?
@@ -247,7 +318,7 @@ class AgentManager:
             if not walkable_adjacent:
                 # Boxed in! Cannot explore further. Revert to IDLE.
                 log_agent_event(agent_id, "Cannot EXPLORE, no walkable adjacent cells. Setting plan to IDLE.", agent, level=logging.WARNING)
-                agent.set_new_plan({'plan': PlanType.IDLE, 'target': None, 'path': None})
+                agent.set_new_plan(Plan())
                 return # Stop execution for this agent this tick
 
             # Prioritize unvisited squares
@@ -276,13 +347,13 @@ class AgentManager:
                 self._execute_move(agent, chosen_direction, agent.simulation_time_step) # Pass time step
             else: # Should not happen if walkable_adjacent check passed
                  log_agent_event(agent_id, "Error determining explore direction despite walkable cells. Setting IDLE.", agent, level=logging.ERROR)
-                 agent.set_new_plan({'plan': PlanType.IDLE, 'target': None, 'path': None})
+                 agent.set_new_plan(Plan())
 
 
         elif plan_type in [PlanType.GO_TO_POS, PlanType.GO_TO_RESOURCE, PlanType.GO_TO_AGENT]:
             if target is None: # Invalid plan target
                 log_agent_event(agent_id, f"Plan {plan_type.name} has no target. Setting to IDLE.", agent, level=logging.WARNING)
-                agent.set_new_plan({'plan': PlanType.IDLE, 'target': None, 'path': None})
+                agent.set_new_plan(Plan())
                 return
 
             target_pos = None
@@ -291,12 +362,12 @@ class AgentManager:
                 if target_agent and target_agent.is_alive(): target_pos = (target_agent.x, target_agent.y)
                 else: # Target agent gone/dead, invalidate plan
                      log_agent_event(agent_id, f"Target Agent {target} for {plan_type.name} invalid. Setting plan to IDLE.", agent)
-                     agent.set_new_plan({'plan': PlanType.IDLE, 'target': None, 'path': None}); return
+                     agent.set_new_plan(Plan()); return
             else: # GO_TO_POS or GO_TO_RESOURCE, target is coords
                 if isinstance(target, (list, tuple)) and len(target) == 2: target_pos = tuple(target)
                 else: # Invalid coordinate target
                     log_agent_event(agent_id, f"Target {target} for {plan_type.name} invalid coords. Setting plan to IDLE.", agent, level=logging.WARNING)
-                    agent.set_new_plan({'plan': PlanType.IDLE, 'target': None, 'path': None}); return
+                    agent.set_new_plan(Plan()); return
 
             ####
             current_pos = (agent.x, agent.y)
@@ -310,9 +381,9 @@ class AgentManager:
                     resource_info = resource_manager.resources.get(current_pos) # Use .get for safety
                     agent_full = agent.resource_level >= AGENT_MAX_RESOURCES
 
-                    if resource_info and resource_info['quantity'] > 0 and not agent_full:
+                    if resource_info and resource_info.quantity > 0 and not agent_full:
                         # Calculate amount to harvest this tick
-                        amount_this_tick = min(agent.harvest_rate, resource_info['quantity'], AGENT_MAX_RESOURCES - agent.resource_level)
+                        amount_this_tick = min(agent.harvest_rate, resource_info.quantity, AGENT_MAX_RESOURCES - agent.resource_level)
 
                         if amount_this_tick > 0:
                             # Perform the harvest action for this tick
@@ -321,10 +392,10 @@ class AgentManager:
                             if harvest_success:
                                 # Get the *new* quantity remaining after harvest
                                 updated_res_info = resource_manager.resources.get(current_pos)
-                                new_quantity = updated_res_info['quantity'] if updated_res_info else 0
+                                new_quantity = updated_res_info.quantity if updated_res_info else 0
                                 # Update the agent's own memory immediately
                                 agent.known_resources[current_pos] = {
-                                    'type': resource_info.get('type', 'Unknown'), # Use original type pre-depletion
+                                    'type': resource_info.type, # Use original type pre-depletion
                                     'last_seen_quantity': new_quantity,
                                     'last_seen_tick': agent.simulation_time_step # Use current tick
                                 }
@@ -338,22 +409,22 @@ class AgentManager:
 
                             # Check completion conditions *after* harvesting
                             resource_still_present = current_pos in resource_manager.resources # Re-check as harvest might deplete it
-                            resource_has_quantity = resource_still_present and resource_manager.resources[current_pos]['quantity'] > 0
+                            resource_has_quantity = resource_still_present and resource_manager.resources[current_pos].quantity > 0
                             agent_full_now = agent.resource_level >= AGENT_MAX_RESOURCES
 
                             if not resource_has_quantity or agent_full_now:
                                 # Harvesting complete (depleted OR agent full)
                                 log_agent_event(agent_id, f"Finished HARVESTING at {target_pos} ({'depleted' if not resource_has_quantity else 'agent full'}). Setting plan to IDLE.", agent)
-                                agent.set_new_plan({'plan': PlanType.IDLE, 'target': None, 'path': None})
+                                agent.set_new_plan(Plan())
                             # else: Resource remains & agent not full -> Plan remains GO_TO_RESOURCE, will harvest again next tick
 
                         else: # Cannot harvest (agent full? resource 0?) - Should be caught by initial check, but safety else
                              log_agent_event(agent_id, f"Cannot harvest at {target_pos} (agent full or resource empty?). Setting plan to IDLE.", agent, level=logging.WARNING)
-                             agent.set_new_plan({'plan': PlanType.IDLE, 'target': None, 'path': None})
+                             agent.set_new_plan(Plan())
 
                     else: # Resource gone before harvesting started OR agent arrived full
                         log_agent_event(agent_id, f"Cannot start HARVEST at {target_pos} ({'resource gone' if not resource_info else 'agent full'}). Setting plan to IDLE.", agent, level=logging.WARNING)
-                        agent.set_new_plan({'plan': PlanType.IDLE, 'target': None, 'path': None})
+                        agent.set_new_plan(Plan())
                     # --- ^^^ End Timed Harvesting Logic ^^^ ---
 
                 elif plan_type == PlanType.GO_TO_AGENT:
@@ -368,10 +439,10 @@ class AgentManager:
                          log_agent_event(agent_id, f"Initiated GROUP REQUEST to Agent {target}.", agent)
                          log_agent_event(target, f"Received GROUP REQUEST from Agent {agent_id}.", target_agent)
                     # Set plan to IDLE, wait for acceptance or new plan
-                    agent.set_new_plan({'plan': PlanType.IDLE, 'target': None, 'path': None})
+                    agent.set_new_plan(Plan())
 
                 else: # GO_TO_POS completed
-                     agent.set_new_plan({'plan': PlanType.IDLE, 'target': None, 'path': None})
+                     agent.set_new_plan(Plan())
 
             else: # Not at target, execute one move step
                 # --- VVV REVISED Movement Logic VVV ---
@@ -399,13 +470,13 @@ class AgentManager:
                     if not move_successful:
                         # Move failed, reset plan
                         log_agent_event(agent_id, f"Move {move_dir} failed/blocked. Resetting plan to IDLE.", agent, level=logging.INFO)
-                        agent.set_new_plan({'plan': PlanType.IDLE, 'target': None, 'path': None})
+                        agent.set_new_plan(Plan())
                 else:
                     # This case should ideally only happen if current_pos == target_pos,
                     # which is handled by the 'if' block above. Log warning if reached.
                     log_agent_event(agent_id, f"Move calculation resulted in empty direction (dx={dx}, dy={dy}). Already at target?", agent, level=logging.WARNING)
                     # Set plan to IDLE to force re-evaluation if stuck
-                    agent.set_new_plan({'plan': PlanType.IDLE, 'target': None, 'path': None})
+                    agent.set_new_plan(Plan())
 
         elif plan_type == PlanType.FORM_GROUP_WITH:
              target_agent_id = target
@@ -424,21 +495,21 @@ class AgentManager:
                  target_agent.pending_group_requests_from.add(agent.id)
                  # --- VVV Set Target Flag & Self Plan VVV ---
                  target_agent.group_request_pending_decision = True # Signal target to decide
-                 agent.set_new_plan({'plan': PlanType.WAITING_GROUP_RESPONSE, 'target': target_agent_id, 'path': None}) # Set self to wait
+                 agent.set_new_plan(Plan(PlanType.WAITING_GROUP_RESPONSE, target_agent_id)) # Set self to wait
                  # --- ^^^ Set Target Flag & Self Plan ^^^ ---
                  log_agent_event(agent_id, f"Initiated GROUP REQUEST to Agent {target_agent_id}. Now WAITING_GROUP_RESPONSE.", agent)
                  log_agent_event(target_agent_id, f"Received GROUP REQUEST from Agent {agent_id}. Decision pending.", target_agent)
              else:
                  # Failed to initiate
                  log_agent_event(agent_id, f"Execute FORM_GROUP_WITH {target_agent_id} failed (conditions changed?). Setting plan to IDLE.", agent, level=logging.WARNING)
-                 agent.set_new_plan({'plan': PlanType.IDLE, 'target': None, 'path': None})
+                 agent.set_new_plan(Plan())
 
         elif plan_type == PlanType.ACCEPT_GROUP_FROM:
              # This plan is chosen by LLM, but execution happens in _process_llm_results immediately
              # This block shouldn't normally be reached if _process_llm_results handles it.
              # If reached, implies LLM response processing failed somehow? Set to IDLE.
              log_agent_event(agent_id, f"Reached execute step for ACCEPT_GROUP_FROM (should be handled in results). Setting to IDLE.", agent, level=logging.WARNING)
-             agent.set_new_plan({'plan': PlanType.IDLE, 'target': None, 'path': None})
+             agent.set_new_plan(Plan())
 
 
         elif plan_type == PlanType.ATTACK_TARGET:
@@ -463,11 +534,11 @@ class AgentManager:
                           log_agent_event(agent_id, f"Plan ATTACK_TARGET {target_id} failed (target not adjacent).", agent, level=logging.INFO)
 
                   if not success: # If initiation failed (out of range, invalid, etc.)
-                      agent.set_new_plan({'plan': PlanType.IDLE, 'target': None, 'path': None})
+                      agent.set_new_plan(Plan())
                   # If success, agent state becomes in_combat, stopping plan execution next tick
 
              else: # Invalid target
-                  agent.set_new_plan({'plan': PlanType.IDLE, 'target': None, 'path': None})
+                  agent.set_new_plan(Plan())
 
     def _execute_move(self, agent, direction, current_time_step):
          """Helper to execute a move action."""
@@ -491,10 +562,12 @@ class AgentManager:
                   else:
                       # Target cell is valid and not occupied by an agent, proceed with move
                       # grid_manager.move_object handles removing from old, placing in new, and updating agent coords
+                      old_pos = (agent.x, agent.y)
                       move_success = self.grid_manager.move_object(agent, agent.x, agent.y, new_x, new_y)
                       if move_success:
+                          self._on_agent_moved(agent, old_pos)
                           agent.visited_trail.append(((new_x, new_y), current_time_step))
-                          log_agent_event(agent.id, f"Added ({new_x},{new_y}) to visited trail.", agent, level=logging.DEBUG)
+                          log_agent_event(agent.id, lambda: f"Added ({new_x},{new_y}) to visited trail.", agent, level=logging.DEBUG)
               else:
                   # Target coordinate itself is invalid
                   log_agent_event(agent.id, f"Cannot move {direction} to ({new_x},{new_y}), invalid coordinate.", agent, level=logging.WARNING)
@@ -523,8 +596,11 @@ class AgentManager:
                  dx, dy = move_map[target]
                  new_x, new_y = agent.x + dx, agent.y + dy
                  # move_object handles grid updates and agent internal coord update
+                 old_pos = (agent.x, agent.y)
                  if not self.grid_manager.move_object(agent, agent.x, agent.y, new_x, new_y):
                       log_agent_event(agent_id, f"Failed to move {target} to ({new_x},{new_y}) (blocked/invalid?).", agent, level=logging.WARNING)
+                 else:
+                      self._on_agent_moved(agent, old_pos)
             else:
                 log_agent_event(agent_id, f"Tried invalid MOVE target: {target}", agent, level=logging.WARNING)
 
@@ -628,8 +704,8 @@ class AgentManager:
                     res_info = obj[1]
                     # Update agent's memory with current info
                     agent.known_resources[pos] = {
-                        'type': res_info.get('type', 'Unknown'),
-                        'last_seen_quantity': res_info.get('quantity', 0),
+                        'type': res_info.type,
+                        'last_seen_quantity': res_info.quantity,
                         'last_seen_tick': current_time_step
                     }
                     seen_resource_positions_this_tick.add(pos)
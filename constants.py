@@ -64,6 +64,8 @@ if not LLM_CONFIGS:
 # LLM_MODEL_NAME = "gemma3:4b"
 # LLM_TIMEOUT = 20
 LLM_DECISION_FREQUENCY = 5 # how many ticks to respond
+MAX_INFLIGHT_LLM = 32 # Cap on queued-but-unprocessed LLM requests (backpressure)
+LLM_WORKERS = 3 # Worker threads draining the LLM request queue concurrently
 # BASE_OLLAMA_PORT = 11434
 # --- END REMOVED ---
 
@@ -6,6 +6,7 @@ class GroupManager:
     """Manages all groups in the simulation."""
     def __init__(self, agent_manager):
         self.groups = {} # group_id -> Group object
+        self.group_colors = {} # group_id -> color, mirrors groups for cheap render lookups
         self.next_group_id = 0
         self.agent_manager = agent_manager
         logging.info("GroupManager initialized.")
@@ -40,6 +41,7 @@ class GroupManager:
 
             if added_ok:
                 self.groups[new_id] = group
+                self.group_colors[new_id] = group.color
                 self.next_group_id += 1
                 # Clear pending requests (agents clear internally on join/color set)
                 # self.agent_manager.clear_pending_requests_involving(acceptor_id) # Done implicitly by agent
@@ -81,6 +83,7 @@ class GroupManager:
     def disband_group(self, group_id):
         """Removes an empty group from the simulation."""
         group = self.groups.pop(group_id, None) # Remove from dict
+        self.group_colors.pop(group_id, None) # Keep color mirror in sync
         if group:
             logging.info(f"Group {group_id} disbanded (no members left).")
             # Ensure combat state is cleaned up if group was fighting
@@ -3,8 +3,54 @@ from enum import Enum
 from collections import deque # For efficient agent history logs
 import requests
 import json     # Needed for make_llm_api_call
+import re
+import threading
+import queue    # For queue.Full / queue.Empty raised by SpscRing
 import time
 
+# Precompiled pattern for stripping ```json ... ``` fences around LLM output
+# in a single scan instead of chained startswith/endswith/strip passes.
+_JSON_FENCE_RE = re.compile(r'^\s*```(?:json)?\s*(.*?)\s*```\s*$', re.S)
+
+# --- VVV Invariant request fragments (built once, reused per call) VVV ---
+_BASE_HEADERS = {'Content-Type': 'application/json'}
+# IMPORTANT: Include safety settings to avoid blocks for common content
+_GEMINI_SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+]
+# --- ^^^ Invariant request fragments ^^^ ---
+
+# --- VVV Fast JSON (orjson) with stdlib fallback VVV ---
+# orjson parses/serializes multi-KB LLM responses several times faster than
+# stdlib json. Fall back to stdlib if it is not installed.
+try:
+    import orjson
+    def _json_loads(data): return orjson.loads(data)
+    def _json_dumps(obj): return orjson.dumps(obj)
+except ImportError:
+    def _json_loads(data): return json.loads(data)
+    def _json_dumps(obj): return json.dumps(obj).encode('utf-8')
+# --- ^^^ Fast JSON ^^^ ---
+
+# --- VVV Optional numba JIT with no-op fallback VVV ---
+# Tight numeric loops (e.g. the trail-marker kernel in the renderer) are
+# decorated with @njit so numba compiles them to native code when it is
+# installed; without numba the decorator is a pass-through and the plain
+# Python body runs instead.
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        if args and callable(args[0]): # Used bare: @njit
+            return args[0]
+        def _passthrough(func): # Used with options: @njit(cache=True)
+            return func
+        return _passthrough
+# --- ^^^ Optional numba JIT ^^^ ---
+
 # --- Enums and Helper Functions ---
 class ActionType(Enum):
     IDLE = 0
@@ -27,42 +73,193 @@ class PlanType(Enum):
     WAITING_LLM = 9 # (COLLECT_HERE removed, HARVESTING removed)
     RESPOND_TO_GROUP_REQUEST = 11 # Special state to prioritize group decision LLM call
     WAITING_GROUP_RESPONSE = 12 # State for the agent who initiated the request
-    
+
+class Plan:
+    """Agent plan record with fixed slots.
+
+    Replaces the ad-hoc {'plan': ..., 'target': ..., 'path': ...} dicts that
+    were built by the thousands per run: no per-instance dict, cheaper to
+    allocate, and attribute access instead of string hashing.
+    """
+    __slots__ = ('plan', 'target', 'path')
+
+    def __init__(self, plan=PlanType.IDLE, target=None, path=None):
+        self.plan = plan
+        self.target = target
+        self.path = path
+
+    def __repr__(self):
+        return f"Plan({self.plan.name}, target={self.target})"
+
+# Case-insensitive PlanType lookup table. Skips the Enum __getitem__ protocol
+# and the .upper() allocation per LLM response for the common casings.
+_PLAN_BY_NAME = {p.name: p for p in PlanType}
+_PLAN_BY_NAME.update({p.name.lower(): p for p in PlanType})
+
+
 def manhattan_distance(pos1, pos2):
     """Calculates Manhattan distance between two (x, y) tuples."""
     return abs(pos1[0] - pos2[0]) + abs(pos1[1] - pos2[1])
 
+# --- VVV SPSC ring queue for main <-> LLM worker hand-off VVV ---
+class SpscRing:
+    """Bounded single-producer/single-consumer queue built on a plain deque.
+
+    deque.append()/popleft() are atomic under the GIL, so the hot put/get
+    path needs no lock at all - only a consumer with nothing to read touches
+    the threading.Event. Mirrors the subset of the queue.Queue API the sim
+    uses (put/put_nowait/get/get_nowait/empty) plus drain() for batch
+    consumption. Capacity is rounded up to a power of two; only put_nowait
+    enforces it (raising queue.Full), so callers opt in to backpressure.
+    """
+    __slots__ = ('_buf', '_capacity', 'ready')
+
+    def __init__(self, capacity=1024):
+        cap = 1
+        while cap < capacity: cap <<= 1
+        self._capacity = cap
+        self._buf = deque()
+        self.ready = threading.Event() # Set on every put; consumers may wait/clear
+
+    def put(self, item):
+        """Appends an item unconditionally (never blocks, never raises)."""
+        self._buf.append(item)
+        self.ready.set()
+
+    def put_nowait(self, item):
+        """Appends an item; raises queue.Full if the ring is at capacity."""
+        if len(self._buf) >= self._capacity: raise queue.Full
+        self._buf.append(item)
+        self.ready.set()
+
+    def get(self):
+        """Pops the oldest item, blocking until one is available."""
+        while True:
+            try: return self._buf.popleft()
+            except IndexError: pass
+            self.ready.clear()
+            # Re-check after clearing: a put may have raced between the failed
+            # popleft and the clear, in which case its set() must not be lost.
+            try: return self._buf.popleft()
+            except IndexError: pass
+            self.ready.wait()
+
+    def get_nowait(self):
+        """Pops the oldest item; raises queue.Empty if nothing is queued."""
+        try: return self._buf.popleft()
+        except IndexError: raise queue.Empty from None
+
+    def empty(self):
+        return not self._buf
+
+    def drain(self):
+        """Pops and returns everything queued so far as a list."""
+        buf = self._buf
+        out = []
+        while True:
+            try: out.append(buf.popleft())
+            except IndexError: return out
+# --- ^^^ SPSC ring queue ^^^ ---
+
 # --- VVV Agent Log File Handling VVV ---
 _agent_log_files = {} # Cache for agent-specific file handles: {agent_id: file_handle}
 _agent_log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s') # Optional: Use logging formatter style
 
+# Pending (agent_id, log_line) records for the background writer thread.
+# deque with maxlen is a thread-safe drop-oldest ring: producers only pay for
+# an append; the writer thread does all the file I/O and flushing.
+_LOG_RING_CAPACITY = 8192
+_log_ring = deque(maxlen=_LOG_RING_CAPACITY)
+_log_writer_started = False
+_log_writer_lock = threading.Lock()
+
+# Timestamp prefix cache: all events within the same wall-clock second share
+# the same strftime result, so only re-format when the second rolls over.
+_ts_cache = [0, ""] # [int second, formatted "%Y-%m-%d %H:%M:%S"]
+# Level names never change; avoid the logging.getLevelName call per event
+_LEVEL_NAMES = {level: logging.getLevelName(level) for level in
+                (logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR, logging.CRITICAL)}
+
+def _drain_log_ring():
+    """Writes every queued record to its agent log file. Returns touched ids."""
+    touched = set()
+    while True:
+        try:
+            agent_id, log_line = _log_ring.popleft()
+        except IndexError:
+            break # Ring empty
+        try:
+            file_handle = _agent_log_files.get(agent_id)
+            if file_handle is None:
+                filename = f"agent{agent_id}.log"
+                # Open in 'w' (write mode) to clear the file each time the simulation starts
+                file_handle = open(filename, 'w', encoding='utf-8')
+                _agent_log_files[agent_id] = file_handle
+                logging.info(f"Opened log file {filename} for Agent {agent_id}") # Log file opening to main log
+            file_handle.write(log_line)
+            touched.add(agent_id)
+        except Exception as e:
+            logging.error(f"Error writing to agent log file for Agent {agent_id}: {e}")
+    return touched
+
+def _log_writer_loop():
+    """Daemon loop: drain the ring in batches, flush, sleep briefly."""
+    while True:
+        touched = _drain_log_ring()
+        for agent_id in touched:
+            try:
+                _agent_log_files[agent_id].flush()
+            except Exception as e:
+                logging.error(f"Error flushing agent log file for Agent {agent_id}: {e}")
+        time.sleep(0.005)
+
+def _ensure_log_writer():
+    """Starts the background log-writer thread on first use."""
+    global _log_writer_started
+    if not _log_writer_started:
+        with _log_writer_lock:
+            if not _log_writer_started:
+                threading.Thread(target=_log_writer_loop, name="agent-log-writer", daemon=True).start()
+                _log_writer_started = True
+
+_root_logger = logging.getLogger() # Cached: isEnabledFor check per event, no getLogger call
+
 def log_agent_event(agent_id, message, agent_ref=None, level=logging.INFO):
-    """Logs to main file, agent-specific file, and optionally internal history."""
+    """Logs to main file, agent-specific file, and optionally internal history.
+
+    `message` may be a zero-arg callable for expensive-to-format messages;
+    it is only invoked when `level` is enabled, so filtered events cost a
+    single isEnabledFor check instead of an f-string build.
+    """
+    if not _root_logger.isEnabledFor(level):
+        return # Level filtered - skip all formatting and queueing
+    if callable(message):
+        message = message()
+
     # 1. Log to main simulation.log via root logger
     root_logger_message = f"Agent {agent_id}: {message}"
     logging.log(level, root_logger_message)
 
-    # 2. Log to agent-specific file (e.g., agent0.log)
+    # 2. Queue for the agent-specific file (e.g., agent0.log). The background
+    #    writer thread performs the actual write/flush so callers (sim loop,
+    #    LLM worker) never block on disk I/O. Oldest entries are dropped if
+    #    the ring overflows.
     try:
-        if agent_id not in _agent_log_files:
-            filename = f"agent{agent_id}.log"
-            # Open in 'w' (write mode) to clear the file each time the simulation starts
-            _agent_log_files[agent_id] = open(filename, 'w', encoding='utf-8')
-            logging.info(f"Opened log file {filename} for Agent {agent_id}") # Log file opening to main log
-
-        file_handle = _agent_log_files[agent_id]
-
-        # Format the message for the agent file
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-        ms = f"{time.time()%1:.3f}"[1:] # Milliseconds part
-        level_name = logging.getLevelName(level)
+        # Format the message for the agent file. The date/time prefix is cached
+        # by integer second - strftime/localtime run at most once per second.
+        now = time.time()
+        sec = int(now)
+        if sec != _ts_cache[0]:
+            _ts_cache[0] = sec
+            _ts_cache[1] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(sec))
+        level_name = _LEVEL_NAMES.get(level) or logging.getLevelName(level)
         # Manually format like the basic config formatter
-        log_line = f"{timestamp},{ms[1:]} - {level_name} - {message}\n" # Use message directly, it's already agent-specific context
+        log_line = f"{_ts_cache[1]},{int((now - sec) * 1000):03d} - {level_name} - {message}\n" # Use message directly, it's already agent-specific context
 
-        file_handle.write(log_line)
-        file_handle.flush() # Ensure it's written immediately for debugging
+        _ensure_log_writer()
+        _log_ring.append((agent_id, log_line))
     except Exception as e:
-        logging.error(f"Error writing to agent log file for Agent {agent_id}: {e}")
+        logging.error(f"Error queuing agent log line for Agent {agent_id}: {e}")
 
     # 3. Append to agent's internal history deque (if agent_ref provided)
     if agent_ref and hasattr(agent_ref, 'history_log'):
@@ -71,8 +268,9 @@ def log_agent_event(agent_id, message, agent_ref=None, level=logging.INFO):
         agent_ref.history_log.append(f"{time_step_str}{message}")
 
 def close_agent_log_files():
-    """Closes all open agent-specific log file handles."""
+    """Flushes pending records and closes all agent-specific log files."""
     logging.info("Closing agent-specific log files...")
+    _drain_log_ring() # Write anything still queued for the background writer
     count = 0
     for agent_id, handle in _agent_log_files.items():
         try:
@@ -84,147 +282,217 @@ def close_agent_log_files():
     logging.info(f"Closed {count} agent log files.")
 # --- ^^^ Agent Log File Handling ^^^ ---
 
+# --- VVV LLM Plan Parsing/Validation (runs on the worker thread) VVV ---
+def parse_llm_plan(agent_id, parsed_decision, agent=None):
+    """Converts a raw decision dict into a typed (PlanType, target) tuple.
+
+    Runs on the LLM worker thread so the main loop only applies plan-state
+    transitions instead of doing string/shape validation per result. Unknown
+    plan names and malformed targets degrade to (IDLE, None), mirroring the
+    old main-thread validation.
+    """
+    plan_name_str = parsed_decision.get("plan", "IDLE")
+    plan_target = parsed_decision.get("target") # Target can be None, int, list
+
+    # Convert plan name string to PlanType via the precomputed table; only
+    # fall back to .upper() for mixed casings.
+    parsed_plan_type = _PLAN_BY_NAME.get(plan_name_str) if isinstance(plan_name_str, str) else None
+    if parsed_plan_type is None and isinstance(plan_name_str, str):
+        parsed_plan_type = _PLAN_BY_NAME.get(plan_name_str.upper())
+    if parsed_plan_type is None:
+        log_agent_event(agent_id, f"LLM plan name '{plan_name_str}' unknown. Default IDLE.", agent, level=logging.WARNING)
+        return (PlanType.IDLE, None)
+
+    valid_target = None
+    if parsed_plan_type == PlanType.GO_TO_RESOURCE or parsed_plan_type == PlanType.GO_TO_POS:
+        if isinstance(plan_target, (list, tuple)) and len(plan_target) == 2 and \
+           all(isinstance(n, (int, float)) for n in plan_target):
+            # Target looks like valid coordinates
+            valid_target = tuple(int(round(n)) for n in plan_target)
+        else:
+            # Invalid target format for this plan type
+            log_agent_event(agent_id, f"Invalid target format '{plan_target}' for plan {parsed_plan_type.name}. Defaulting to IDLE.", agent, level=logging.WARNING)
+            return (PlanType.IDLE, None)
+    elif parsed_plan_type in (PlanType.GO_TO_AGENT, PlanType.FORM_GROUP_WITH, PlanType.ACCEPT_GROUP_FROM, PlanType.ATTACK_TARGET):
+        if isinstance(plan_target, int):
+            valid_target = plan_target # Target is an ID
+        else:
+            # Invalid target format for this plan type
+            log_agent_event(agent_id, f"Invalid target format '{plan_target}' for plan {parsed_plan_type.name}. Defaulting to IDLE.", agent, level=logging.WARNING)
+            return (PlanType.IDLE, None)
+    elif parsed_plan_type == PlanType.EXPLORE:
+        # Optional target, can be None or direction string
+        valid_target = plan_target if isinstance(plan_target, str) and plan_target.upper() in ('N','S','E','W','NE','NW','SE','SW') else None
+
+    # --- Final check: If target ended up None for a plan that requires one ---
+    if valid_target is None and parsed_plan_type not in (PlanType.IDLE, PlanType.EXPLORE):
+        log_agent_event(agent_id, f"Plan {parsed_plan_type.name} requires a target but got None after validation. Defaulting IDLE.", agent, level=logging.WARNING)
+        return (PlanType.IDLE, None)
+
+    return (parsed_plan_type, valid_target)
+# --- ^^^ LLM Plan Parsing/Validation ^^^ ---
+
 # --- LLM Worker Thread Function (Modified) ---
 def llm_worker(request_q, result_q, agent_manager): # <<< Pass agent_manager
-    """Processes LLM requests using agent-specific configs via make_llm_api_call."""
+    """Processes batched LLM requests using agent-specific configs.
+
+    Each queue item is a list of (agent_id, context) pairs sharing one LLM
+    config (one batch per endpoint per tick); a bare None is the stop signal.
+    Neither the ollama generate API nor Gemini generateContent accepts
+    multiple prompts per call, so the batch is multiplexed into sequential
+    calls here - the batching amortizes the per-agent queue hand-off and
+    keeps the endpoints' request ordering coherent per tick.
+    """
     logging.info("LLM worker thread started.")
     while True:
-        agent_id = None
-        try:
-            agent_id, context = request_q.get() # Blocks until item available
-            if agent_id is None: logging.info("LLM worker stop signal."); break # Stop signal
-
-            # Get agent using manager
-            agent = agent_manager.get_agent(agent_id)
-            if not agent or not agent.is_alive(): # Check if agent still exists and is alive
-                logging.warning(f"LLM worker: Agent {agent_id} not found or dead. Skipping request.")
-                result_q.put((agent_id, None)); continue # Signal failure back
-            if not agent.llm_config: # Check if agent has config assigned
-                logging.warning(f"LLM worker: Agent {agent_id} missing LLM config. Skipping request.")
-                result_q.put((agent_id, None)); continue
-
-            logging.debug(f"LLM worker processing for Agent {agent_id} using config {agent.llm_config.get('id')}")
-
-            # --- VVV Use new API call function VVV ---
-            # This function now handles API type switching, headers, body, parsing etc.
-            parsed_decision_dict = make_llm_api_call(agent_id, context, agent.llm_config)
-            # --- ^^^ Use new API call function ^^^ ---
-
-            # Put the parsed dictionary (or None) onto the result queue
-            result_q.put((agent_id, parsed_decision_dict))
-            logging.debug(f"LLM worker finished processing for Agent {agent_id}")
-
-        except Exception as e: # Catch errors in the worker loop itself
-            logging.error(f"Error in LLM worker thread loop (Agent {agent_id}): {e}", exc_info=True)
-            if agent_id is not None: # Try to signal failure if we know the agent ID
-                 try: result_q.put((agent_id, None))
-                 except Exception as qe: logging.error(f"Error putting fail result on queue: {qe}")
-        finally:
-            # No task_done needed for basic queue.Queue
-            pass
+        batch = request_q.get() # Blocks until item available
+        if batch is None: logging.info("LLM worker stop signal."); break # Stop signal
+
+        for agent_id, context in batch:
+            try:
+                # Get agent using manager
+                agent = agent_manager.get_agent(agent_id)
+                if not agent or not agent.is_alive(): # Check if agent still exists and is alive
+                    logging.warning(f"LLM worker: Agent {agent_id} not found or dead. Skipping request.")
+                    result_q.put((agent_id, None)); continue # Signal failure back
+                if not agent.llm_config: # Check if agent has config assigned
+                    logging.warning(f"LLM worker: Agent {agent_id} missing LLM config. Skipping request.")
+                    result_q.put((agent_id, None)); continue
+
+                logging.debug(f"LLM worker processing for Agent {agent_id} using config {agent.llm_config.get('id')}")
+
+                # --- VVV Use new API call function VVV ---
+                # This function now handles API type switching, headers, body, parsing etc.
+                parsed_decision_dict = make_llm_api_call(agent_id, context, agent.llm_config)
+                # --- ^^^ Use new API call function ^^^ ---
+
+                if parsed_decision_dict is None: # API call failed
+                    result_q.put((agent_id, None))
+                else:
+                    # Validate/coerce here, off the main thread, so the sim loop
+                    # receives an already-typed (PlanType, target) tuple.
+                    result_q.put((agent_id, parse_llm_plan(agent_id, parsed_decision_dict, agent)))
+                logging.debug(f"LLM worker finished processing for Agent {agent_id}")
+
+            except Exception as e: # Catch errors in the worker loop itself
+                logging.error(f"Error in LLM worker thread loop (Agent {agent_id}): {e}", exc_info=True)
+                try: result_q.put((agent_id, None)) # Signal failure back
+                except Exception as qe: logging.error(f"Error putting fail result on queue: {qe}")
 
     logging.info("LLM worker thread stopped.")
 
 
-def make_llm_api_call(agent_id, context_prompt, agent_llm_config):
-    """
-    Makes API call based on agent's config (handles different API types).
-    Returns the *parsed JSON* plan dictionary, or None on failure.
+def _build_request_builder(agent_id, agent_llm_config):
     """
-    if not agent_llm_config:
-        log_agent_event(agent_id, "LLM call failed: Agent has no LLM config.", level=logging.ERROR)
-        return None
+    Constructs a prompt -> (url, payload) closure specialized for one config.
 
-    # Extract details from the specific agent's config
+    The api_type dispatch, endpoint/key lookups and all invariant payload
+    parts are evaluated once per config; subsequent calls only slot in the
+    prompt. Returns None (after logging why) if the config is unusable.
+    """
     api_type = agent_llm_config.get('api_type', 'unknown').lower()
     endpoint = agent_llm_config.get('endpoint')
     api_key = agent_llm_config.get('api_key') # Key should be loaded from env var previously
     model_name = agent_llm_config.get('model_name')
-    timeout = LLM_TIMEOUT # Use global timeout from constants (loaded from config)
 
     if not endpoint:
         log_agent_event(agent_id, f"LLM call failed: Missing 'endpoint' in config ID {agent_llm_config.get('id')}.", level=logging.ERROR)
         return None
 
-    headers = {'Content-Type': 'application/json'}
-    payload = {}
-    request_endpoint = endpoint # Use original endpoint by default
-    response_text = None
-
-    log_agent_event(agent_id, f"Preparing {api_type} request to {endpoint}...", level=logging.DEBUG)
-
-    try:
-        # --- Prepare request based on API type ---
-        if api_type == 'ollama':
-            # Assume Ollama server expects model name in payload
-            payload = {
+    if api_type == 'ollama':
+        # Assume Ollama server expects model name in payload
+        def build(context_prompt):
+            return endpoint, {
                 "model": model_name,
                 "prompt": context_prompt,
                 "stream": False,
                 "format": "json", # Request direct JSON output if supported
                 "options": {"temperature": 0.7}
             }
-            # Log prompt before sending
-            log_agent_event(agent_id, f"Agent {agent_id} (Ollama) - Sending Prompt:\n-------START PROMPT-------\n{context_prompt}\n-------END PROMPT-------")
 
-        elif api_type == 'gemini':
-            if not api_key:
-                log_agent_event(agent_id, f"LLM call failed: Missing API key for Gemini config ID {agent_llm_config.get('id')}.", level=logging.ERROR)
-                return None
-            # Add API key to endpoint URL
-            request_endpoint = f"{endpoint}?key={api_key}"
-            # Gemini API structure expects specific JSON format
-            payload = {
+    elif api_type == 'gemini':
+        if not api_key:
+            log_agent_event(agent_id, f"LLM call failed: Missing API key for Gemini config ID {agent_llm_config.get('id')}.", level=logging.ERROR)
+            return None
+        # Add API key to endpoint URL (computed once)
+        request_endpoint = f"{endpoint}?key={api_key}"
+        generation_config = {
+            "temperature": 0.7,
+            # Crucial: Tell Gemini we want JSON output if the model supports it
+            "responseMimeType": "application/json",
+        }
+        def build(context_prompt):
+            return request_endpoint, {
                 "contents": [{
                     "parts": [{"text": context_prompt}] # The actual prompt goes here
                 }],
-                "generationConfig": {
-                    "temperature": 0.7,
-                    # Crucial: Tell Gemini we want JSON output if the model supports it
-                    "responseMimeType": "application/json",
-                },
-                 # IMPORTANT: Include safety settings to avoid blocks for common content
-                "safetySettings": [
-                    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-                    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-                    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-                    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-                ]
+                "generationConfig": generation_config,
+                 # Invariant safety settings, built once at module scope
+                "safetySettings": _GEMINI_SAFETY_SETTINGS
             }
-             # Log prompt before sending
-            log_agent_event(agent_id, f"Agent {agent_id} (Gemini) - Sending Prompt:\n-------START PROMPT-------\n{context_prompt}\n-------END PROMPT-------")
 
-        # TODO: Add elif blocks for 'openai' or other API types if needed
-        # Example for OpenAI-compatible:
-        # elif api_type == 'openai':
-        #    if not api_key: # OpenAI key needed
-        #         log_agent_event(agent_id, f"LLM call failed: Missing API key for OpenAI config...", level=logging.ERROR); return None
-        #    headers['Authorization'] = f"Bearer {api_key}"
-        #    payload = {
-        #        "model": model_name,
-        #        "messages": [{"role": "user", "content": context_prompt}],
-        #        "temperature": 0.7,
-        #        "response_format": { "type": "json_object" } # Request JSON mode
-        #    }
-        #    logging.info(f"Agent {agent_id} (OpenAI) - Sending Prompt:\n{context_prompt}")
+    # TODO: Add elif blocks for 'openai' or other API types if needed
+    # (OpenAI-compatible would precompute the Authorization header and
+    # build {"model", "messages", "temperature", "response_format"} here.)
+
+    else:
+        log_agent_event(agent_id, f"LLM call failed: Unknown api_type '{api_type}' in config.", level=logging.ERROR)
+        return None
+
+    return build
 
-        else:
-            log_agent_event(agent_id, f"LLM call failed: Unknown api_type '{api_type}' in config.", level=logging.ERROR)
-            return None
+
+def make_llm_api_call(agent_id, context_prompt, agent_llm_config):
+    """
+    Makes API call based on agent's config (handles different API types).
+    Returns the *parsed JSON* plan dictionary, or None on failure.
+    """
+    if not agent_llm_config:
+        log_agent_event(agent_id, "LLM call failed: Agent has no LLM config.", level=logging.ERROR)
+        return None
+
+    api_type = agent_llm_config.get('api_type', 'unknown').lower()
+    timeout = LLM_TIMEOUT # Use global timeout from constants (loaded from config)
+    response_text = None
+
+    # Lazily build and cache the request-builder closure on the config dict.
+    # Configs are fixed for an agent's lifetime, so the api_type dispatch and
+    # payload scaffolding only ever run once per config.
+    builder = agent_llm_config.get('_builder')
+    if builder is None:
+        builder = _build_request_builder(agent_id, agent_llm_config)
+        if builder is None:
+            return None # Config unusable; reason already logged
+        agent_llm_config['_builder'] = builder
+
+    log_agent_event(agent_id, f"Preparing {api_type} request to {agent_llm_config.get('endpoint')}...", level=logging.DEBUG)
+
+    try:
+        request_endpoint, payload = builder(context_prompt)
+
+        # Log prompt before sending (only when DEBUG is on - the prompt can be
+        # many KB and formatting it just to discard it is wasted work)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            log_agent_event(agent_id, "".join([f"Agent {agent_id} ({api_type}) - Sending Prompt:\n-------START PROMPT-------\n", context_prompt, "\n-------END PROMPT-------"]), level=logging.DEBUG)
 
         # --- Make API Call ---
-        response = requests.post(request_endpoint, headers=headers, json=payload, timeout=timeout)
+        # Serialize the payload ourselves (orjson when available) instead of
+        # letting requests run it through stdlib json.
+        response = requests.post(request_endpoint, headers=_BASE_HEADERS, data=_json_dumps(payload), timeout=timeout)
         # --- Log Raw Status/Response Text ---
         log_agent_event(agent_id, f"Agent {agent_id} - Received Raw Status Code: {response.status_code}")
+        # Read the body bytes ONCE - response.text would re-decode response.content,
+        # doubling the decode work on long responses.
+        raw_bytes = response.content
         try:
             # Try to log response body, but handle cases where it might not be JSON
-            raw_response_body = response.text # Get raw text first
+            raw_response_body = raw_bytes.decode('utf-8', 'replace')
             log_agent_event(agent_id, f"Agent {agent_id} - Received Raw Response Body: {raw_response_body}")
         except Exception as log_err:
             log_agent_event(agent_id, f"Agent {agent_id} - Could not log raw response body: {log_err}")
 
         response.raise_for_status() # Check for HTTP errors AFTER logging raw response
-        response_json = response.json() # Now parse JSON
+        response_json = _json_loads(raw_bytes) # Now parse JSON (bytes-level, no extra decode)
 
         # --- Parse response based on API type ---
         if api_type == 'ollama':
@@ -233,23 +501,20 @@ def make_llm_api_call(agent_id, context_prompt, agent_llm_config):
             if not response_text:
                  log_agent_event(agent_id, f"Ollama response missing 'response' field in JSON: {response_json}", level=logging.ERROR); return None
         elif api_type == 'gemini':
-            # Check for safety blocks first
-            if not response_json.get('candidates'):
-                 finish_reason = response_json.get('promptFeedback', {}).get('blockReason', 'Unknown reason')
-                 safety_ratings = response_json.get('promptFeedback', {}).get('safetyRatings', [])
-                 log_agent_event(agent_id, f"Gemini response blocked. Reason: {finish_reason}, Ratings: {safety_ratings}", level=logging.WARNING)
-                 return None
-            # Extract text part - assuming responseMimeType worked and it's JSON directly
-            # or the JSON string we need is within the text part
+            # Fast path: direct indexing into the expected success structure.
+            # The slow diagnostic path (safety blocks, malformed responses) only
+            # runs when that raises.
             try:
-                # Access nested structure carefully
-                part = response_json['candidates'][0]['content']['parts'][0]
-                if 'text' in part:
-                     response_text = part['text']
-                else: # Should not happen with JSON mimetype request, but maybe handle function calls later?
-                     log_agent_event(agent_id, f"Gemini response part missing 'text': {part}", level=logging.ERROR); return None
-            except (IndexError, KeyError, TypeError) as e:
-                 log_agent_event(agent_id, f"Error parsing Gemini response structure: {e}. Response: {response_json}", level=logging.ERROR); return None
+                response_text = response_json['candidates'][0]['content']['parts'][0]['text']
+            except (KeyError, IndexError, TypeError) as e:
+                if not response_json.get('candidates'):
+                     feedback = response_json.get('promptFeedback', {})
+                     finish_reason = feedback.get('blockReason', 'Unknown reason')
+                     safety_ratings = feedback.get('safetyRatings', [])
+                     log_agent_event(agent_id, f"Gemini response blocked. Reason: {finish_reason}, Ratings: {safety_ratings}", level=logging.WARNING)
+                else:
+                     log_agent_event(agent_id, f"Error parsing Gemini response structure: {e}. Response: {response_json}", level=logging.ERROR)
+                return None
 
         # elif api_type == 'openai':
         #    try:
@@ -263,17 +528,15 @@ def make_llm_api_call(agent_id, context_prompt, agent_llm_config):
         # --- Final JSON Parsing of the Extracted Text ---
         if response_text:
             try:
-                # Clean potential markdown fences around JSON
-                cleaned_text = response_text.strip()
-                if cleaned_text.startswith("```json"): cleaned_text = cleaned_text[7:]
-                if cleaned_text.endswith("```"): cleaned_text = cleaned_text[:-3]
-                cleaned_text = cleaned_text.strip()
+                # Clean potential markdown fences around JSON (one regex pass)
+                fence_match = _JSON_FENCE_RE.match(response_text)
+                cleaned_text = fence_match.group(1) if fence_match else response_text.strip()
 
                 # Attempt to parse the cleaned text as JSON
-                decision_dict = json.loads(cleaned_text)
+                decision_dict = _json_loads(cleaned_text)
                 log_agent_event(agent_id, f"Agent {agent_id} - Successfully Parsed Decision Dict: {decision_dict}")
                 return decision_dict # Return the parsed dictionary
-            except json.JSONDecodeError as e:
+            except ValueError as e: # Covers json.JSONDecodeError and orjson.JSONDecodeError
                 log_agent_event(agent_id, f"LLM final JSON Decode Error: {e}. Text after cleaning was: '{cleaned_text}'", level=logging.ERROR)
                 return None # Indicate failure
         else:
@@ -282,9 +545,9 @@ def make_llm_api_call(agent_id, context_prompt, agent_llm_config):
 
     # --- Handle Network/Timeout Errors ---
     except requests.exceptions.Timeout:
-         log_agent_event(agent_id, f"LLM API Timeout to {endpoint} after {timeout}s.", level=logging.ERROR)
+         log_agent_event(agent_id, f"LLM API Timeout to {agent_llm_config.get('endpoint')} after {timeout}s.", level=logging.ERROR)
     except requests.exceptions.RequestException as e:
-        log_agent_event(agent_id, f"LLM API Request Error to {endpoint}: {e}", level=logging.ERROR)
+        log_agent_event(agent_id, f"LLM API Request Error to {agent_llm_config.get('endpoint')}: {e}", level=logging.ERROR)
     except Exception as e: # Catch any other unexpected errors during the process
         log_agent_event(agent_id, f"Unexpected error during LLM API call/processing: {e}", level=logging.ERROR, exc_info=True)
 
@@ -1,56 +1,77 @@
 from constants import *
 from helper import *
 import random
+import numpy as np
+from dataclasses import dataclass
+
+@dataclass(slots=True)
+class ResourceDeposit:
+    """Compact record for one resource deposit (slots: no per-instance dict)."""
+    type: str
+    quantity: float
 
 class ResourceManager:
     """Manages resources (spawning, collection) in the simulation."""
     def __init__(self, grid_manager):
         self.grid_manager = grid_manager
-        self.resources = {} # (x, y) -> {'type': 'food', 'quantity': N} map
+        self.resources = {} # (x, y) -> ResourceDeposit map
         self.consumption_rate = AGENT_CONSUMPTION_RATE
+        self._markers = {} # (x, y) -> exact ('Resource', deposit) tuple placed on the grid
+        self._rng = np.random.default_rng() # Batched RNG for bulk spawn sampling
+        self._soa_cache = None # Lazily built (positions, quantities) arrays for rendering
         logging.info("ResourceManager initialized.")
 
     def spawn_resources(self, num_to_spawn):
         """Spawns a number of new resource deposits at random empty locations."""
+        if num_to_spawn <= 0: return
         spawned_count = 0
-        for _ in range(num_to_spawn):
-            pos = self.grid_manager.get_random_empty_cell()
+        # Sample all candidate positions and quantities in one shot instead of
+        # one scalar random call per deposit.
+        xs = self._rng.integers(0, self.grid_manager.width, size=num_to_spawn)
+        ys = self._rng.integers(0, self.grid_manager.height, size=num_to_spawn)
+        quantities = self._rng.integers(RESOURCE_MAX_QUANTITY // 2, RESOURCE_MAX_QUANTITY + 1, size=num_to_spawn)
+        for i in range(num_to_spawn):
+            pos = (int(xs[i]), int(ys[i]))
+            if self.grid_manager.get_objects_at(pos[0], pos[1]):
+                # Sampled cell occupied - fall back to the slower empty-cell search
+                pos = self.grid_manager.get_random_empty_cell()
             if pos:
-                quantity = random.randint(RESOURCE_MAX_QUANTITY // 2, RESOURCE_MAX_QUANTITY)
-                res_info = {'type': 'food', 'quantity': quantity}
+                res_info = ResourceDeposit('food', int(quantities[i]))
                 self.resources[pos] = res_info
                 # Place a marker on the grid for rendering and interaction detection
-                # Use a tuple: ('Resource', dict_with_info) to distinguish from Agent objects
-                self.grid_manager.place_object(('Resource', res_info), pos[0], pos[1])
+                # Use a tuple: ('Resource', deposit) to distinguish from Agent objects.
+                # Remember the exact tuple so depletion can remove it without scanning.
+                marker = ('Resource', res_info)
+                self._markers[pos] = marker
+                self.grid_manager.place_object(marker, pos[0], pos[1])
                 spawned_count += 1
         if spawned_count > 0:
+             self._soa_cache = None # Deposit set changed; rebuild render arrays lazily
              logging.info(f"Spawned {spawned_count} new resource deposits.")
 
+    def get_render_arrays(self):
+        """Returns (positions Nx2 int32, quantities float32) arrays of all deposits.
+
+        Structure-of-arrays view for the renderer: per-deposit ratio/color math
+        runs vectorized in NumPy instead of per-item Python arithmetic. Rebuilt
+        lazily after any spawn or harvest.
+        """
+        if self._soa_cache is None:
+            n = len(self.resources)
+            if n:
+                positions = np.fromiter((c for pos in self.resources for c in pos),
+                                        dtype=np.int32, count=2 * n).reshape(n, 2)
+                quantities = np.fromiter((r.quantity for r in self.resources.values()),
+                                         dtype=np.float32, count=n)
+            else:
+                positions = np.empty((0, 2), dtype=np.int32)
+                quantities = np.empty(0, dtype=np.float32)
+            self._soa_cache = (positions, quantities)
+        return self._soa_cache
+
     def collect_resource(self, agent, x, y):
-        """Allows an agent to collect resources from a specific location."""
-        pos = (x,y)
-        if pos in self.resources:
-            res_info = self.resources[pos]
-            # Determine amount to collect (up to resource availability and agent capacity?)
-            # Simple: Collect fixed amount or remaining, whichever is less
-            collect_amount = min(res_info['quantity'], RESOURCE_COLLECT_AMOUNT)
-            agent.collect_resource(collect_amount) # Update agent's internal resources
-            res_info['quantity'] -= collect_amount # Decrease resource quantity
-
-            # Log the event using the central function
-            log_agent_event(agent.id, f"Collected {collect_amount:.1f} {res_info['type']} at {pos}. Deposit left: {res_info['quantity']:.1f}", agent)
-
-            # Check if resource deposit is depleted
-            if res_info['quantity'] <= 0:
-                logging.info(f"Resource deposit at {pos} depleted.")
-                del self.resources[pos] # Remove from manager's dict
-                # Also remove the marker from the grid
-                resource_marker = ('Resource', res_info) # Recreate marker tuple used for placing
-                self.grid_manager.remove_object(resource_marker, x, y)
-            return True
-        # Log failure if agent tried to collect where there was nothing
-        log_agent_event(agent.id, f"Attempted collection at {pos}, but no resource found.", agent, level=logging.WARNING)
-        return False
+        """Allows an agent to collect a standard amount from a location."""
+        return self._consume(agent, (x, y), RESOURCE_COLLECT_AMOUNT)
 
     def get_resource_locations(self):
         """Returns a dictionary of current resource locations and info."""
@@ -62,47 +83,51 @@ class ResourceManager:
         if random.random() < RESOURCE_SPAWN_RATE:
               self.spawn_resources(1)
 
+    def periodic_spawn_batched(self, ticks):
+        """Batched equivalent of periodic_spawn over several ticks at once.
+
+        Draws the number of spawns for the whole window from a binomial
+        distribution, so callers advancing many ticks avoid one scalar
+        random.random() call per tick.
+        """
+        if ticks <= 0: return
+        num_to_spawn = int(self._rng.binomial(ticks, RESOURCE_SPAWN_RATE))
+        if num_to_spawn > 0:
+            self.spawn_resources(num_to_spawn)
+
     def harvest_resource_at(self, agent, pos_tuple, amount_to_harvest):
         """Allows an agent to harvest a specific amount from a location."""
-        # pos = (x,y) # Already passed as tuple
-        if pos_tuple in self.resources:
-            res_info = self.resources[pos_tuple]
-
-            # Ensure we don't harvest more than available
-            actual_harvest_amount = min(amount_to_harvest, res_info['quantity'])
-
-            if actual_harvest_amount <= 0: # Resource might be empty but not deleted yet
-                 log_agent_event(agent.id, f"Attempted harvest at {pos_tuple}, but resource is empty.", agent, level=logging.WARNING)
-                 return False # Indicate nothing was harvested
-
-            # Update agent's resources
-            agent.collect_resource(actual_harvest_amount)
-            # Decrease resource quantity at location
-            res_info['quantity'] -= actual_harvest_amount
-
-            log_agent_event(agent.id, f"Harvested {actual_harvest_amount:.1f} {res_info['type']} at {pos_tuple}. Deposit left: {res_info['quantity']:.1f}", agent)
-
-            # Check if resource deposit is now depleted
-            if res_info['quantity'] <= 0:
-                logging.info(f"Resource deposit at {pos_tuple} depleted.")
-                # Remove from manager's dict
-                del self.resources[pos_tuple]
-                # Also remove the marker from the grid
-                # Recreate marker tuple used for placing: ('Resource', dict_info)
-                # Need to find the exact marker object on the grid to remove it
-                objects_at_pos = self.grid_manager.get_objects_at(pos_tuple[0], pos_tuple[1])
-                marker_to_remove = None
-                for obj in objects_at_pos:
-                     # Check if it's the resource marker tuple associated with the depleted info
-                     if isinstance(obj, tuple) and obj[0] == 'Resource' and obj[1] is res_info:
-                          marker_to_remove = obj
-                          break
-                if marker_to_remove:
-                     self.grid_manager.remove_object(marker_to_remove, pos_tuple[0], pos_tuple[1])
-                else:
-                     logging.warning(f"Could not find resource marker on grid at {pos_tuple} to remove after depletion.")
-
-            return True # Indicate successful harvest attempt (even if partial)
-        else: # Resource position no longer valid
-            log_agent_event(agent.id, f"Attempted harvest at {pos_tuple}, but no resource found (already depleted?).", agent, level=logging.WARNING)
-            return False # Indicate failure
\ No newline at end of file
+        return self._consume(agent, pos_tuple, amount_to_harvest)
+
+    def _consume(self, agent, pos, amount):
+        """Shared collect/harvest implementation. Returns True if anything was taken."""
+        res_info = self.resources.get(pos)
+        if res_info is None: # Resource position no longer valid
+            log_agent_event(agent.id, f"Attempted harvest at {pos}, but no resource found (already depleted?).", agent, level=logging.WARNING)
+            return False
+
+        # Ensure we don't take more than available
+        actual_amount = min(amount, res_info.quantity)
+        if actual_amount <= 0: # Resource might be empty but not deleted yet
+             log_agent_event(agent.id, f"Attempted harvest at {pos}, but resource is empty.", agent, level=logging.WARNING)
+             return False
+
+        # Update agent's resources and decrease quantity at location
+        agent.collect_resource(actual_amount)
+        res_info.quantity -= actual_amount
+        self._soa_cache = None # Quantities changed; rebuild render arrays lazily
+
+        log_agent_event(agent.id, f"Harvested {actual_amount:.1f} {res_info.type} at {pos}. Deposit left: {res_info.quantity:.1f}", agent)
+
+        # Check if resource deposit is now depleted
+        if res_info.quantity <= 0:
+            logging.info(f"Resource deposit at {pos} depleted.")
+            del self.resources[pos]
+            # Remove the marker via the stored reference - no grid-cell scan needed
+            marker = self._markers.pop(pos, None)
+            if marker is not None:
+                self.grid_manager.remove_object(marker, pos[0], pos[1])
+            else:
+                logging.warning(f"Could not find resource marker on grid at {pos} to remove after depletion.")
+
+        return True # Indicate successful harvest attempt (even if partial)
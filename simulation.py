@@ -1,6 +1,8 @@
 import pygame
 import time
 import logging
+from itertools import islice
+import numpy as np
 import threading # <<< Added
 import queue     # <<< Added
 from constants import *
@@ -12,6 +14,45 @@ from group_manager import GroupManager
 from agent_manager import AgentManager
 from resource_manager import ResourceManager
 
+# --- VVV Trail marker kernel VVV ---
+# Pure numeric loop over all trail points of an agent: bounds filtering,
+# grid->pixel conversion, and fade-bucket selection. Compiled to native code
+# by numba when installed (njit falls back to a no-op decorator otherwise).
+@njit(cache=True)
+def _compute_trail_markers(trail_xy, grid_w, grid_h, cell_size, marker_offset, n_buckets):
+    n = trail_xy.shape[0]
+    xs = np.empty(n, dtype=np.int32)
+    ys = np.empty(n, dtype=np.int32)
+    buckets = np.empty(n, dtype=np.int32)
+    count = 0
+    for i in range(n):
+        x = trail_xy[i, 0]; y = trail_xy[i, 1]
+        if 0 <= x < grid_w and 0 <= y < grid_h:
+            xs[count] = x * cell_size + marker_offset
+            ys[count] = y * cell_size + marker_offset
+            buckets[count] = int((1.0 - i / n) * (n_buckets - 1)) # fade = 1 - i/len
+            count += 1
+    return xs[:count], ys[:count], buckets[:count]
+# --- ^^^ Trail marker kernel ^^^ ---
+
+# --- VVV Agent layout kernel VVV ---
+# The whole numeric preamble of the agent draw loop - pixel coordinates, bar
+# fill widths, HP color buckets - in one function over the SoA arrays. The
+# body is plain vectorized NumPy, so without numba it runs at today's NumPy
+# speed; with numba installed the expressions compile and fuse natively.
+@njit(cache=True)
+def _compute_render_layout(xs, ys, hp_ratios, res_levels, cell_size, inv_max_res, bar_w):
+    px = xs * cell_size
+    py = ys * cell_size
+    cx = px + cell_size // 2
+    cy = py + cell_size // 2
+    hp_ws = (hp_ratios * bar_w).astype(np.int32)
+    res_ratio = np.minimum(1.0, np.maximum(0.0, res_levels * inv_max_res))
+    res_ws = (res_ratio * bar_w).astype(np.int32)
+    hp_buckets = (hp_ratios > 0.2).astype(np.int32) + (hp_ratios > 0.5).astype(np.int32)
+    return px, py, cx, cy, hp_ws, res_ws, hp_buckets
+# --- ^^^ Agent layout kernel ^^^ ---
+
 # --- Simulation Class ---
 
 class Simulation:
@@ -20,21 +61,117 @@ class Simulation:
         self.screen = pygame.display.set_mode((TOTAL_WINDOW_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption("LLM Agent World Simulator")
         self.clock = pygame.time.Clock()
+        # Only let SDL queue the event types the sim actually handles - mouse
+        # motion alone would otherwise dominate the queue every frame.
+        pygame.event.set_allowed([pygame.QUIT, pygame.MOUSEBUTTONDOWN])
+        pygame.event.set_blocked([pygame.MOUSEMOTION, pygame.ACTIVEEVENT, pygame.VIDEOEXPOSE, pygame.KEYUP])
         try: self.font = pygame.font.SysFont(None, 24); self.font_small = pygame.font.SysFont(None, 18)
         except: self.font = pygame.font.Font(None, 24); self.font_small = pygame.font.Font(None, 18); logging.error("Font error.")
 
         self.is_running = True; self.paused = False; self.time_step = 0
+        self._dirty = True # Anything on screen changed since the last frame?
         self.selected_agent_id = None
         self.buttons = {}; self._setup_buttons()
+        self._grid_bg = self._build_grid_bg() # Static grid lines + axis labels, drawn once
+        # Quantity labels only ever show integers 0..RESOURCE_MAX_QUANTITY, so
+        # pre-render them all once instead of a font.render per resource per frame.
+        self._qty_surf_cache = {q: self.font_small.render(str(q), True, COLOR_BLACK)
+                                for q in range(RESOURCE_MAX_QUANTITY + 1)}
+        # Perception circles re-rasterize a ~200px-radius outline per agent per
+        # frame; cache one SRCALPHA stamp per draw color instead.
+        self._perception_circle_cache = {}
+        # Text surfaces (agent IDs, panel labels, button text) are rendered
+        # from a small, mostly-stable set of strings every frame - TTF
+        # rasterization is the hottest per-glyph cost in the render loop, so
+        # cache rendered surfaces keyed by (text, color, font). Bounded with
+        # oldest-first eviction in case dynamic strings churn the cache.
+        self._id_glyph_cache = {}
+        # Agent IDs are numeric, so only the 10 digit glyphs per text color
+        # ever need TTF rasterization; full ID labels are composited from
+        # these and cached per (id, color).
+        self._digit_surfs = {color: [self.font_small.render(str(d), True, color) for d in range(10)]
+                             for color in (COLOR_BLACK, COLOR_WHITE)}
+        self._id_surf_cache = {} # (agent id, text color) -> composited label
+        # --- VVV Agent draw templates VVV ---
+        # Agent bodies/borders/bars were ~6 pygame.draw.rect calls per agent
+        # per frame. Pre-render each shape once per color as a small Surface
+        # template and batch the per-agent placements into one fblits call;
+        # variable-width bar fills reuse a subsurface of a max-width template.
+        # Body and border always draw together, so a fused template per
+        # (body color, border color, border width) halves those blits; the
+        # key space is tiny (palette x four border states).
+        self._agent_tile_cache = {}  # (color, border color, border width) -> body+border template
+        self._bar_fill_cache = {}    # color -> max-width solid bar template
+        bar_w = int(CELL_SIZE * 0.8)
+        # Reciprocal turns the per-agent resource division into a multiply
+        # and folds the AGENT_MAX_RESOURCES > 0 guard out of the loop.
+        self._inv_max_res = 1.0 / AGENT_MAX_RESOURCES if AGENT_MAX_RESOURCES > 0 else 0.0
+        self._hp_bar_bg = pygame.Surface((bar_w, 4)); self._hp_bar_bg.fill(COLOR_BLACK)
+        self._res_bar_bg = pygame.Surface((bar_w, 4)); self._res_bar_bg.fill((50, 50, 50))
+        # Trail markers: the fade gradient is continuous but 16 quantized
+        # levels are visually indistinguishable, so cache 16 stamps per
+        # agent color instead of a draw.rect per trail point. The full
+        # gradient per color is computed in one vectorized step on first use.
+        self._trail_marker_cache = {} # color -> [marker template per fade bucket]
+        self._trail_fade_arr = np.array(TRAIL_FADE_COLOR, dtype=np.float32)
+        # Scratch Rects mutated in place across draw-loop iterations (render
+        # thread only) - constructing a fresh Rect per agent/resource crosses
+        # into C extension code and churns the allocator.
+        self._agent_rect = pygame.Rect(0, 0, CELL_SIZE, CELL_SIZE)
+        self._res_tile_rect = pygame.Rect(0, 0, CELL_SIZE - 8, CELL_SIZE - 8) # Matches inflate(-4, -4)
+        # Black-or-white ID text contrast only depends on the draw color, so
+        # the luminance math runs once per color instead of per agent per frame.
+        self._text_color_cache = {} # draw color -> contrasting text color
+        # HP bar color by integer bucket (<=0.2, <=0.5, above) - indexing the
+        # LUT replaces the two-branch conditional per agent and lets the
+        # bucket computation vectorize over the SoA hp array.
+        self._hp_color_lut = (COLOR_GROUP_END, COLOR_RESOURCE, COLOR_GROUP_START)
+        # Bottom-bar info strings only change once per tick (or slower), so
+        # keep one rendered surface per slot and re-render a slot only when
+        # its text changes; the FPS readout refreshes every ~10 frames.
+        self._info_texts = [None] * 4 # Tick / Agents / Groups / FPS
+        self._info_surfs = [None] * 4
+        self._fps_frame_counter = 0
+        # --- ^^^ Agent draw templates ^^^ ---
+
+        # --- VVV Render-thread pipelining VVV ---
+        # The frame compose (all grid/agent/panel blits) runs on a dedicated
+        # thread while the main loop sleeps in clock.tick; only the final
+        # screen blit + flip stay on the main thread, since SDL display calls
+        # are not thread-safe. The kick/done handshake guarantees the compose
+        # never overlaps _handle_input/_tick state mutation.
+        self._render_surface = pygame.Surface((TOTAL_WINDOW_WIDTH, SCREEN_HEIGHT))
+        self._render_kick = threading.Event() # Main -> render thread: state ready to compose
+        self._render_done = threading.Event() # Render thread -> main: compose finished
+        self._render_done.set() # Nothing in flight initially
+        self._render_thread = threading.Thread(target=self._render_loop, daemon=True, name="render-compose")
+        self._render_thread.start()
+        # Dirty-rect presentation: the compose pass records a bounding box of
+        # the dynamic grid content (plus the fixed panel/UI strips) so
+        # _await_render can upload just those regions via display.update
+        # instead of flipping the whole framebuffer. Written by the render
+        # thread, read by the main thread - the kick/done handshake orders it.
+        self._panel_rect = pygame.Rect(SCREEN_WIDTH, 0, INFO_PANEL_WIDTH, SCREEN_HEIGHT)
+        self._ui_rect = pygame.Rect(0, SCREEN_HEIGHT - UI_AREA_HEIGHT, TOTAL_WINDOW_WIDTH, UI_AREA_HEIGHT)
+        self._prev_grid_dirty = None # Last frame's grid bbox (erasure of moved content)
+        self._frame_dirty_rects = None # None -> full flip
+        # Frame budget: when sim ticks outpace the display refresh there is
+        # no point composing/presenting frames nobody would see - skip the
+        # whole render body until a display interval has elapsed.
+        self._render_interval = 1.0 / FPS
+        self._last_render_time = 0.0
+        self._frame_pending = False # A compose was kicked and awaits present
+        # --- ^^^ Render-thread pipelining ^^^ ---
 
         # --- VVV Use Loaded Global Config VVV ---
         # LLM_CONFIGS is loaded from constants.py now
         self.available_llm_configs = LLM_CONFIGS
         # --- ^^^ Use Loaded Global Config ^^^ ---
 
-        # Queues
-        self.llm_request_queue = queue.Queue()
-        self.llm_result_queue = queue.Queue()
+        # Queues - one producer and one consumer each, so the lock-free SPSC
+        # ring replaces queue.Queue's per-put/get lock acquisition.
+        self.llm_request_queue = SpscRing(MAX_INFLIGHT_LLM)
+        self.llm_result_queue = SpscRing()
 
         # Managers (Pass available configs to AgentManager)
         self.grid_manager = GridManager(GRID_WIDTH, GRID_HEIGHT)
@@ -44,11 +181,17 @@ class Simulation:
         self.combat_manager = CombatManager(self.agent_manager, self.group_manager)
         self.agent_manager.combat_manager = self.combat_manager # Link back
 
-        # Start LLM Worker Thread (Pass agent_manager)
-        self.llm_thread = threading.Thread(target=llm_worker,
-                                           args=(self.llm_request_queue, self.llm_result_queue, self.agent_manager), # <<< Pass agent_manager
-                                           daemon=True)
-        self.llm_thread.start()
+        # Start LLM Worker Threads (Pass agent_manager). A small pool drains
+        # the shared request queue so one slow endpoint can't serialize every
+        # agent's planning; the deque-backed ring is safe with multiple
+        # consumers (atomic popleft).
+        self.llm_threads = []
+        for worker_idx in range(LLM_WORKERS):
+            thread = threading.Thread(target=llm_worker,
+                                      args=(self.llm_request_queue, self.llm_result_queue, self.agent_manager), # <<< Pass agent_manager
+                                      daemon=True, name=f"llm-worker-{worker_idx}")
+            thread.start()
+            self.llm_threads.append(thread)
 
         self._initialize_sim() # Create agents using assigned configs
 
@@ -86,6 +229,46 @@ class Simulation:
         logging.debug(f"Pause/Play button setup relative to UI area at {self.buttons['pause_play']['rect']}")
 
 
+    def _build_grid_bg(self):
+        """Pre-renders the static grid background (lines + axis labels) once.
+
+        These never change between frames, so _render just blits the cached
+        surface instead of re-drawing ~40 lines and re-rendering ~40 label
+        texts every frame.
+        """
+        grid_h = SCREEN_HEIGHT - UI_AREA_HEIGHT
+        bg = pygame.Surface((SCREEN_WIDTH, grid_h))
+        bg.fill(COLOR_BLACK)
+
+        # Grid Lines
+        for x in range(0, SCREEN_WIDTH, CELL_SIZE): pygame.draw.line(bg, COLOR_GRID, (x, 0), (x, grid_h))
+        for y in range(0, grid_h, CELL_SIZE): pygame.draw.line(bg, COLOR_GRID, (0, y), (SCREEN_WIDTH, y))
+
+        # --- VVV Draw Axis Labels VVV ---
+        label_interval = 1 # Draw label every cell
+        label_padding = 5  # Pixels padding from edge
+        label_color = COLOR_TEXT
+
+        # Y-axis labels (Left edge)
+        for y_label in range(0, GRID_HEIGHT, label_interval):
+            # Only draw if label fits within grid height bounds
+            if (y_label * CELL_SIZE) < grid_h:
+                label_surf = self.font_small.render(str(y_label), True, label_color)
+                # Position slightly indented from left, vertically aligned with grid line
+                label_rect = label_surf.get_rect(topleft=(label_padding, y_label * CELL_SIZE + label_padding))
+                bg.blit(label_surf, label_rect)
+
+        # X-axis labels (Top edge)
+        for x_label in range(0, GRID_WIDTH, label_interval):
+            # Only draw if label fits within grid width bounds
+            if (x_label * CELL_SIZE) < SCREEN_WIDTH:
+                label_surf = self.font_small.render(str(x_label), True, label_color)
+                # Position slightly indented from top, horizontally aligned with grid line
+                label_rect = label_surf.get_rect(topleft=(x_label * CELL_SIZE + label_padding, label_padding))
+                bg.blit(label_surf, label_rect)
+        # --- ^^^ Draw Axis Labels ^^^ ---
+        return bg
+
     def _initialize_sim(self):
         logging.info("Initializing simulation world...")
         for i in range(INITIAL_AGENTS):
@@ -96,21 +279,29 @@ class Simulation:
         self.resource_manager.spawn_resources(INITIAL_RESOURCES)
         logging.info(f"World initialized. Agents: {len(self.agent_manager.agents)}, Resources: {len(self.resource_manager.resources)}")
 
-    def run(self): # (Unchanged structure)
+    def run(self): # (Pipelined: compose overlaps the frame sleep)
         logging.info("Starting simulation loop.")
         while self.is_running:
             start_time = time.time()
+            self._await_render() # Present the previous frame's compose (main thread owns the display)
             self._handle_input()
-            self._process_llm_results() # Process first
+            # Only touch the result queue when the worker has signalled new
+            # results (the ring's Event is set on every put) instead of
+            # polling an empty queue every frame.
+            if self.llm_result_queue.ready.is_set():
+                self.llm_result_queue.ready.clear()
+                self._process_llm_results() # Process first
             if not self.paused: self._tick() # Run logic if not paused
-            self._render() # Always render
+            self._kick_render() # Compose this frame on the render thread during the sleep below
             self.clock.tick(FPS)
             # (Performance logging)
         # (Cleanup)
-        logging.info("Simulation loop ended. Stopping LLM worker...")
-        self.llm_request_queue.put((None, None))
-        self.llm_thread.join(timeout=2.0) # Increase timeout slightly
-        if self.llm_thread.is_alive(): logging.warning("LLM worker thread did not stop.")
+        logging.info("Simulation loop ended. Stopping LLM workers...")
+        for _ in self.llm_threads:
+            self.llm_request_queue.put(None) # Bare None = worker stop signal, one per worker
+        for thread in self.llm_threads:
+            thread.join(timeout=2.0) # Increase timeout slightly
+            if thread.is_alive(): logging.warning(f"LLM worker thread {thread.name} did not stop.")
         pygame.quit()
         logging.info("Pygame quit.")
 
@@ -118,67 +309,68 @@ class Simulation:
         """Processes Pygame events like closing the window and mouse clicks."""
         mouse_pos = pygame.mouse.get_pos() # Get current mouse position
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                self.is_running = False
-                return # Exit event loop immediately on quit
+        pygame.event.pump() # Let SDL gather pending events once
+
+        # Drain by type in the C layer rather than fetching every event and
+        # type-matching it in Python - the sim only cares about QUIT and clicks.
+        if pygame.event.get(eventtype=pygame.QUIT):
+            self.is_running = False
+            return # Exit event loop immediately on quit
+
+        for event in pygame.event.get(eventtype=pygame.MOUSEBUTTONDOWN):
+            if event.button == 1: # Left mouse button
+                self._dirty = True # Clicks can change selection/pause state
+                clicked_on_button = False
+                # Check Pause/Play button click
+                button = self.buttons['pause_play']
+                # --- Button Click Check ---
+                # Check if click's Y coordinate is within the UI bar's screen region
+                if mouse_pos[1] >= SCREEN_HEIGHT - UI_AREA_HEIGHT:
+                    # Convert mouse Y to be relative to the ui_surface for collision check
+                    ui_mouse_pos_y = mouse_pos[1] - (SCREEN_HEIGHT - UI_AREA_HEIGHT)
+                    # Use screen X directly (assuming UI bar starts at X=0)
+                    ui_mouse_pos = (mouse_pos[0], ui_mouse_pos_y)
 
-            # Handle Mouse Clicks
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                if event.button == 1: # Left mouse button
-                    clicked_on_button = False
-                    # Check Pause/Play button click
                     button = self.buttons['pause_play']
-                    # --- Button Click Check ---
-                    # Check if click's Y coordinate is within the UI bar's screen region
-                    if mouse_pos[1] >= SCREEN_HEIGHT - UI_AREA_HEIGHT:
-                        # Convert mouse Y to be relative to the ui_surface for collision check
-                        ui_mouse_pos_y = mouse_pos[1] - (SCREEN_HEIGHT - UI_AREA_HEIGHT)
-                        # Use screen X directly (assuming UI bar starts at X=0)
-                        ui_mouse_pos = (mouse_pos[0], ui_mouse_pos_y)
-
-                        button = self.buttons['pause_play']
-                        # --- DEBUG: Log coordinates and rect for collision check ---
-                        logging.debug(f"Click in UI area. Mouse relative: {ui_mouse_pos}, Button rect: {button['rect']}")
-                        # Use the button's relative rect and the calculated relative mouse position
-                        if button['rect'].collidepoint(ui_mouse_pos):
-                             # --- DEBUG: Confirm collision ---
-                             logging.debug("Pause/Play button collision DETECTED!")
-                             clicked_on_button = True
-                             self._handle_button_click('pause_play')
-                        # else: # Optional: Log miss
-                        #    logging.debug("Click in UI area, but missed button.")
-
-                    # --- End Button Click Check ---
-
-                    # If no button was clicked, check for agent selection click
-                    if not clicked_on_button:
-                        # Check if click was within the grid area
-                        if mouse_pos[0] < SCREEN_WIDTH and mouse_pos[1] < SCREEN_HEIGHT - UI_AREA_HEIGHT:
-                            grid_x = mouse_pos[0] // CELL_SIZE
-                            grid_y = mouse_pos[1] // CELL_SIZE
-                            clicked_agent = None
-                            # Find agent at clicked grid cell (check topmost if multiple)
-                            objects_at_click = self.grid_manager.get_objects_at(grid_x, grid_y)
-                            for obj in reversed(objects_at_click): # Check top object first
-                                if isinstance(obj, Agent):
-                                     clicked_agent = obj
-                                     break
-
-                            if clicked_agent: # An agent was clicked
-                                if self.selected_agent_id != clicked_agent.id:
-                                     self.selected_agent_id = clicked_agent.id
-                                     logging.info(f"Selected Agent {self.selected_agent_id}")
-                                # If clicking the same agent again, could deselect? Or keep selected. Current: Keep selected.
-                            else: # Clicked on empty space or resource within grid
-                                if self.selected_agent_id is not None:
-                                     logging.info(f"Deselected Agent {self.selected_agent_id}")
-                                     self.selected_agent_id = None # Deselect
-                        else: # Clicked outside grid (in UI area or panel), deselect
-                             if self.selected_agent_id is not None:
-                                 logging.info(f"Deselected Agent {self.selected_agent_id} (clicked outside grid)")
-                                 self.selected_agent_id = None
-
+                    # --- DEBUG: Log coordinates and rect for collision check ---
+                    logging.debug(f"Click in UI area. Mouse relative: {ui_mouse_pos}, Button rect: {button['rect']}")
+                    # Use the button's relative rect and the calculated relative mouse position
+                    if button['rect'].collidepoint(ui_mouse_pos):
+                         # --- DEBUG: Confirm collision ---
+                         logging.debug("Pause/Play button collision DETECTED!")
+                         clicked_on_button = True
+                         self._handle_button_click('pause_play')
+                    # else: # Optional: Log miss
+                    #    logging.debug("Click in UI area, but missed button.")
+
+                # --- End Button Click Check ---
+
+                # If no button was clicked, check for agent selection click
+                if not clicked_on_button:
+                    # Check if click was within the grid area
+                    if mouse_pos[0] < SCREEN_WIDTH and mouse_pos[1] < SCREEN_HEIGHT - UI_AREA_HEIGHT:
+                        grid_x = mouse_pos[0] // CELL_SIZE
+                        grid_y = mouse_pos[1] // CELL_SIZE
+                        # O(1) hit-test via the manager's position index
+                        clicked_agent = self.agent_manager.get_agent_at(grid_x, grid_y)
+
+                        if clicked_agent: # An agent was clicked
+                            if self.selected_agent_id != clicked_agent.id:
+                                 self.selected_agent_id = clicked_agent.id
+                                 logging.info(f"Selected Agent {self.selected_agent_id}")
+                            # If clicking the same agent again, could deselect? Or keep selected. Current: Keep selected.
+                        else: # Clicked on empty space or resource within grid
+                            if self.selected_agent_id is not None:
+                                 logging.info(f"Deselected Agent {self.selected_agent_id}")
+                                 self.selected_agent_id = None # Deselect
+                    else: # Clicked outside grid (in UI area or panel), deselect
+                         if self.selected_agent_id is not None:
+                             logging.info(f"Deselected Agent {self.selected_agent_id} (clicked outside grid)")
+                             self.selected_agent_id = None
+
+        # Discard everything else (mouse motion, keyboard, etc.) so the SDL
+        # queue never backs up with event types we don't handle.
+        pygame.event.clear()
 
     def _handle_button_click(self, name):
         """Handles the action for the clicked button."""
@@ -200,7 +392,8 @@ class Simulation:
         # Initiate LLM Requests needs the queue to put requests onto
         self.agent_manager.initiate_llm_requests(self.group_manager, self.resource_manager, self.time_step, self.llm_request_queue)
         self.combat_manager.resolve_all_combats()
-        for agent_id in list(self.agent_manager.agents.keys()):
+        # Iterate the manager's cached id list - no per-tick list(keys()) copy.
+        for agent_id in self.agent_manager.get_agent_ids():
              self.agent_manager.execute_agent_plan_step(agent_id, self.group_manager, self.resource_manager)
         self.agent_manager.apply_consumption()
         self.agent_manager.handle_deaths(self.group_manager)
@@ -209,253 +402,377 @@ class Simulation:
         self.resource_manager.periodic_spawn()
         logging.debug(f"--- Tick {self.time_step} End ---")
         self.time_step += 1
+        self._dirty = True # World state advanced; next _render must redraw
         if not self.agent_manager.agents: logging.info("All agents died."); self.is_running = False
 
     def _process_llm_results(self):
-        """Processes results from the LLM worker thread queue."""
+        """Applies validated plan results from the LLM worker thread queue.
+
+        The worker parses/validates each decision into a typed
+        (PlanType, target) tuple before queueing, so this main-thread pass
+        only performs plan-state transitions - those touch group_manager and
+        combat_manager and must stay on this thread.
+        """
+        # Drain everything queued so far in one batch - atomic deque pops,
+        # no per-item lock round-trips.
+        results = self.llm_result_queue.drain()
+        if not results: return
         try:
-            while not self.llm_result_queue.empty():
-                agent_id, parsed_decision = self.llm_result_queue.get_nowait()
-                agent = self.agent_manager.get_agent(agent_id)
+            agents_by_id = self.agent_manager.agents # Hoisted: skip get_agent call per lookup
+            for agent_id, typed_plan in results:
+                agent = agents_by_id.get(agent_id)
 
                 if agent and agent.is_alive():
-                    log_agent_event(agent_id, f"Processing LLM response. Current plan: {agent.current_plan['plan'].name}", agent, level=logging.DEBUG)
-
-                    if parsed_decision: # Check if LLM call succeeded & parsing in worker worked
-                        try:
-                            plan_name_str = parsed_decision.get("plan", "IDLE")
-                            plan_target = parsed_decision.get("target") # Target can be None, int, list
-
-                            # Check if this response was for a group decision
-                            was_group_decision = agent.current_plan['plan'] == PlanType.RESPOND_TO_GROUP_REQUEST
-                            # Convert plan name string to PlanType Enum
-                            try:
-                                parsed_plan_type = PlanType[plan_name_str.upper()]
-                                log_agent_event(agent_id, f"LLM parsed plan type is '{parsed_plan_type}'. Group decision: {was_group_decision}")
-                            except KeyError: 
-                                log_agent_event(agent_id, f"LLM plan name '{plan_name_str}' unknown. Default IDLE.", agent, level=logging.WARNING); parsed_plan_type = PlanType.IDLE
-
-                            # --- VVV Handle Specific Group Decision Responses VVV ---
-                            if was_group_decision:
-                                log_agent_event(agent_id, f"starting group logic.")
-                                requester_id = plan_target if parsed_plan_type in [PlanType.ACCEPT_GROUP_FROM, PlanType.ATTACK_TARGET] else None
-                                requester_agent = self.agent_manager.get_agent(requester_id) if requester_id is not None else None
-                                log_agent_event(agent_id, f"Group decision was from requester '{requester_id}'. Parsed plan type is {parsed_plan_type}")
-
-                                if parsed_plan_type == PlanType.ACCEPT_GROUP_FROM:
-                                    log_agent_event(agent_id, f"LLM chose ACCEPT_GROUP_FROM {requester_id}.", agent)
-                                    # --- Perform Acceptance Logic ---
-                                    conditions_met = ( # Re-check conditions *now*
-                                        agent.group_id is None and requester_agent and requester_agent.is_alive() and
-                                        requester_agent.group_id is None and requester_id in agent.pending_group_requests_from and
-                                        requester_agent.pending_group_request_to == agent.id and
-                                        manhattan_distance((agent.x, agent.y), (requester_agent.x, requester_agent.y)) <= 1 )
-
-                                    if conditions_met:
-                                        new_group = self.group_manager.create_group_with_agents(agent.id, requester_id)
-                                        if new_group:
-                                            # Group formed successfully. Both agents' plans were reset by joining.
-                                            # Also clear requester's waiting plan state
-                                            requester_agent.set_new_plan({'plan': PlanType.IDLE, 'target': None, 'path': None})
-                                        else: # Group creation failed unexpectedly
-                                             new_plan = {'plan': PlanType.IDLE, 'target': None, 'path': None} # Keep self IDLE
-                                             if requester_agent: requester_agent.set_new_plan({'plan': PlanType.IDLE, 'target': None, 'path': None}) # Reset requester too
-                                    else: # Conditions no longer met
-                                         log_agent_event(agent_id, f"Conditions to ACCEPT group from {requester_id} no longer met. Ignoring.", agent, level=logging.WARNING)
-                                         new_plan = {'plan': PlanType.IDLE, 'target': None, 'path': None} # Keep self IDLE
-                                         # Clear requester's state too
-                                         if requester_agent:
-                                              requester_agent.pending_group_request_to = None
-                                              requester_agent.set_new_plan({'plan': PlanType.IDLE, 'target': None, 'path': None})
-                                    # Clear the specific incoming request that was decided upon
-                                    if requester_id in agent.pending_group_requests_from: agent.pending_group_requests_from.remove(requester_id)
-                                    agent.set_new_plan(new_plan) # Set plan (likely IDLE if group formed/failed)
-                                    continue # Skip normal plan processing below for this agent
-
-                                elif parsed_plan_type == PlanType.ATTACK_AGENT:
-                                     log_agent_event(agent_id, f"LLM chose ATTACK_AGENT {requester_id} instead of grouping.", agent)
-                                     # Initiate combat if requester still valid
-                                     if requester_agent and requester_agent.is_alive():
-                                         self.combat_manager.initiate_combat(agent.id, requester_id)
-                                     # Clear requester's outgoing request & waiting state
-                                     if requester_agent:
-                                         requester_agent.pending_group_request_to = None
-                                         requester_agent.set_new_plan({'plan': PlanType.IDLE, 'target': None, 'path': None})
-                                     # Clear the specific incoming request
-                                     if requester_id in agent.pending_group_requests_from: agent.pending_group_requests_from.remove(requester_id)
-                                     new_plan = {'plan': PlanType.IDLE, 'target': None, 'path': None} # Self becomes IDLE after deciding
-                                     agent.set_new_plan(new_plan)
-                                     continue # Skip normal processing
-
-                                else: # Implicit rejection (IDLE or other plan chosen)
-                                     log_agent_event(agent_id, f"LLM chose {parsed_plan_type.name} (Implicitly ignored group request from {requester_id}).", agent)
-                                     # Clear requester's state
+                    log_agent_event(agent_id, lambda: f"Processing LLM response. Current plan: {agent.current_plan.plan.name}", agent, level=logging.DEBUG)
+
+                    # Check if this response was for a group decision
+                    was_group_decision = agent.current_plan.plan == PlanType.RESPOND_TO_GROUP_REQUEST
+
+                    if typed_plan is not None: # LLM call succeeded & worker validated it
+                        parsed_plan_type, valid_target = typed_plan
+                        log_agent_event(agent_id, lambda: f"LLM parsed plan type is '{parsed_plan_type}'. Group decision: {was_group_decision}")
+
+                        # --- VVV Handle Specific Group Decision Responses VVV ---
+                        if was_group_decision:
+                            log_agent_event(agent_id, f"starting group logic.")
+                            requester_id = valid_target if parsed_plan_type in [PlanType.ACCEPT_GROUP_FROM, PlanType.ATTACK_TARGET] else None
+                            requester_agent = agents_by_id.get(requester_id) if requester_id is not None else None
+                            # Resolve liveness once for the whole branch
+                            requester_alive = requester_agent is not None and requester_agent.is_alive()
+                            log_agent_event(agent_id, f"Group decision was from requester '{requester_id}'. Parsed plan type is {parsed_plan_type}")
+
+                            if parsed_plan_type == PlanType.ACCEPT_GROUP_FROM:
+                                log_agent_event(agent_id, f"LLM chose ACCEPT_GROUP_FROM {requester_id}.", agent)
+                                new_plan = Plan() # Self ends up IDLE either way
+                                # --- Perform Acceptance Logic ---
+                                conditions_met = ( # Re-check conditions *now*
+                                    agent.group_id is None and requester_alive and
+                                    requester_agent.group_id is None and requester_id in agent.pending_group_requests_from and
+                                    requester_agent.pending_group_request_to == agent.id and
+                                    manhattan_distance((agent.x, agent.y), (requester_agent.x, requester_agent.y)) <= 1 )
+
+                                if conditions_met:
+                                    new_group = self.group_manager.create_group_with_agents(agent.id, requester_id)
+                                    if new_group:
+                                        # Group formed successfully. Both agents' plans were reset by joining.
+                                        # Also clear requester's waiting plan state
+                                        requester_agent.set_new_plan(Plan())
+                                    else: # Group creation failed unexpectedly
+                                         if requester_agent: requester_agent.set_new_plan(Plan()) # Reset requester too
+                                else: # Conditions no longer met
+                                     log_agent_event(agent_id, f"Conditions to ACCEPT group from {requester_id} no longer met. Ignoring.", agent, level=logging.WARNING)
+                                     # Clear requester's state too
                                      if requester_agent:
-                                         requester_agent.pending_group_request_to = None
-                                         requester_agent.set_new_plan({'plan': PlanType.IDLE, 'target': None, 'path': None})
-                                     # Clear the specific incoming request
-                                     if requester_id in agent.pending_group_requests_from: agent.pending_group_requests_from.remove(requester_id)
-                                     # Fall through to normal plan validation/setting below
-
-                            # --- Normal Plan Validation/Setting ---
-                            # (Only runs if NOT a specific group decision response handled above)
-                            valid_target = None
-                            if parsed_plan_type == PlanType.GO_TO_RESOURCE or parsed_plan_type == PlanType.GO_TO_POS:
-                                if isinstance(plan_target, (list, tuple)) and len(plan_target) == 2 and \
-                                   all(isinstance(n, (int, float)) for n in plan_target):
-                                    # Target looks like valid coordinates
-                                    valid_target = tuple(int(round(n)) for n in plan_target)
-                                else:
-                                     # Invalid target format for this plan type
-                                     log_agent_event(agent_id, f"Invalid target format '{plan_target}' for plan {parsed_plan_type.name}. Defaulting to IDLE.", agent, level=logging.WARNING)
-                                     parsed_plan_type = PlanType.IDLE # <<< ENSURE THIS LINE IS PRESENT
-                                     valid_target = None
-                            elif parsed_plan_type in [PlanType.GO_TO_AGENT, PlanType.FORM_GROUP_WITH, PlanType.ACCEPT_GROUP_FROM, PlanType.ATTACK_TARGET]:
-                                if isinstance(plan_target, int):
-                                    valid_target = plan_target # Target is an ID
-                                else:
-                                     # Invalid target format for this plan type
-                                     log_agent_event(agent_id, f"Invalid target format '{plan_target}' for plan {parsed_plan_type.name}. Defaulting to IDLE.", agent, level=logging.WARNING)
-                                     parsed_plan_type = PlanType.IDLE # <<< ENSURE THIS LINE IS PRESENT
-                                     valid_target = None
-                            elif parsed_plan_type == PlanType.EXPLORE:
-                                 # Optional target, can be None or direction string
-                                 valid_target = plan_target if isinstance(plan_target, str) and plan_target.upper() in ['N','S','E','W','NE','NW','SE','SW'] else None
-                            elif parsed_plan_type == PlanType.IDLE:
-                                 valid_target = None # IDLE needs no target
-
-                            # --- Final check: If target ended up None for a plan that requires one ---
-                            if valid_target is None and parsed_plan_type not in [PlanType.IDLE, PlanType.EXPLORE]:
-                                 log_agent_event(agent_id, f"Plan {parsed_plan_type.name} requires a target but got None after validation. Defaulting IDLE.", agent, level=logging.WARNING)
-                                 parsed_plan_type = PlanType.IDLE
-                                 valid_target = None
-
-                            new_plan = {'plan': parsed_plan_type, 'target': valid_target, 'path': None}
-                            # Add pathfinding here if needed
-
-                        except Exception as e:
-                            log_agent_event(
-                                agent_id,
-                                f"Error parsing/validating LLM plan result. Type: {type(e).__name__}, Msg: {e}. Decision: {parsed_decision}",
-                                agent,
-                                level=logging.ERROR,
-                                exc_info=True # Add traceback to log file for detailed debugging
-                            )                            
-                            new_plan = {'plan': PlanType.IDLE, 'target': None, 'path': None} # Default to IDLE on error
-
-                            # Keep default IDLE plan
+                                          requester_agent.pending_group_request_to = None
+                                          requester_agent.set_new_plan(Plan())
+                                # Clear the specific incoming request that was decided upon
+                                if requester_id in agent.pending_group_requests_from: agent.pending_group_requests_from.remove(requester_id)
+                                agent.set_new_plan(new_plan) # Set plan (likely IDLE if group formed/failed)
+                                continue # Skip normal plan processing below for this agent
+
+                            elif parsed_plan_type == PlanType.ATTACK_TARGET:
+                                 log_agent_event(agent_id, f"LLM chose ATTACK_TARGET {requester_id} instead of grouping.", agent)
+                                 # Initiate combat if requester still valid
+                                 if requester_alive:
+                                     self.combat_manager.initiate_combat(agent.id, requester_id)
+                                 # Clear requester's outgoing request & waiting state
+                                 if requester_agent:
+                                     requester_agent.pending_group_request_to = None
+                                     requester_agent.set_new_plan(Plan())
+                                 # Clear the specific incoming request
+                                 if requester_id in agent.pending_group_requests_from: agent.pending_group_requests_from.remove(requester_id)
+                                 new_plan = Plan() # Self becomes IDLE after deciding
+                                 agent.set_new_plan(new_plan)
+                                 continue # Skip normal processing
+
+                            else: # Implicit rejection (IDLE or other plan chosen)
+                                 log_agent_event(agent_id, f"LLM chose {parsed_plan_type.name} (Implicitly ignored group request from {requester_id}).", agent)
+                                 # Clear requester's state
+                                 if requester_agent:
+                                     requester_agent.pending_group_request_to = None
+                                     requester_agent.set_new_plan(Plan())
+                                 # Clear the specific incoming request
+                                 if requester_id in agent.pending_group_requests_from: agent.pending_group_requests_from.remove(requester_id)
+                                 # Fall through to normal plan setting below
+
+                        # --- Normal Plan Setting ---
+                        # (Validation already happened on the worker thread)
+                        new_plan = Plan(parsed_plan_type, valid_target)
+                        # Add pathfinding here if needed
+
                     else: # LLM call failed
                          log_agent_event(agent_id, "LLM plan decision failed (worker returned None). Defaulting to IDLE.", agent, level=logging.WARNING)
-                         new_plan = {'plan': PlanType.IDLE, 'target': None, 'path': None} # Default to IDLE on error
-                         # Keep default IDLE plan
+                         parsed_plan_type = PlanType.IDLE
+                         new_plan = Plan() # Default to IDLE on error
 
                     # Update agent's plan (unless handled specifically by ACCEPT/ATTACK above)
                     # The check 'was_group_decision' combined with 'continue' ensures we don't overwrite
                     # the state set during group acceptance/attack initiation.
-                    if not was_group_decision or (parsed_plan_type != PlanType.ACCEPT_GROUP_FROM and parsed_plan_type != PlanType.ATTACK_AGENT):
+                    if not was_group_decision or (parsed_plan_type != PlanType.ACCEPT_GROUP_FROM and parsed_plan_type != PlanType.ATTACK_TARGET):
                          agent.set_new_plan(new_plan)
 
                 # ... (handle agent died while waiting) ...
-                self.llm_result_queue.task_done() # Mark task processed
 
-        except queue.Empty: pass # Normal
         except Exception as e: logging.error(f"Error processing LLM result queue: {e}", exc_info=True)
 
-    def _render(self):
-        """Draws the entire simulation state to the screen."""
+    def _render_loop(self):
+        """Render-thread body: composes frames into the offscreen surface.
+
+        Runs one compose per kick from the main loop, which by then has
+        finished all state mutation for the frame, so no locking is needed.
+        """
+        while self.is_running:
+            if not self._render_kick.wait(timeout=0.1): continue # Re-check is_running periodically
+            self._render_kick.clear()
+            try:
+                self._compose_frame()
+            except Exception as e:
+                logging.error(f"Error composing frame: {e}", exc_info=True)
+            finally:
+                self._render_done.set()
+
+    def _kick_render(self):
+        """Hands the finished frame state to the render thread (main thread)."""
+        # While paused nothing on screen changes unless input did - skip the
+        # whole redraw (hundreds of blits/draws) and leave the last frame up.
+        if self.paused and not self._dirty: return
+        # Within the display's frame budget nothing new would be seen either;
+        # keep simulating and render again once the interval has elapsed.
+        now = time.perf_counter()
+        if now - self._last_render_time < self._render_interval: return
+        self._last_render_time = now
+        self._dirty = False
+        self._frame_pending = True
+        self._render_done.clear()
+        self._render_kick.set()
+
+    def _await_render(self):
+        """Waits for any in-flight compose and presents it (main thread)."""
+        self._render_done.wait()
+        if not self._frame_pending: return # Nothing new composed - last frame stays up
+        self._frame_pending = False
+        rects = self._frame_dirty_rects
+        # Targeted update when the changed area is localized; per-rect
+        # overhead makes update() a loss once most of the screen changed,
+        # so fall back to a full flip past ~50% coverage.
+        if rects is not None and sum(r.width * r.height for r in rects) * 2 < TOTAL_WINDOW_WIDTH * SCREEN_HEIGHT:
+            for r in rects:
+                self.screen.blit(self._render_surface, r, r)
+            pygame.display.update(rects)
+        else:
+            self.screen.blit(self._render_surface, (0, 0))
+            pygame.display.flip()
+
+    def _get_text_surf(self, text, color, font):
+        """Returns a cached rendered surface for (text, color, font)."""
+        key = (text, color, id(font))
+        surf = self._id_glyph_cache.get(key)
+        if surf is None:
+            if len(self._id_glyph_cache) >= 512: # Evict oldest (dicts keep insertion order)
+                self._id_glyph_cache.pop(next(iter(self._id_glyph_cache)))
+            surf = font.render(text, True, color)
+            self._id_glyph_cache[key] = surf
+        return surf
+
+    def _get_id_surf(self, agent_id, color):
+        """Returns the agent's ID label composited from cached digit glyphs."""
+        key = (agent_id, color)
+        surf = self._id_surf_cache.get(key)
+        if surf is None:
+            digits = self._digit_surfs[color]
+            glyphs = [digits[ord(ch) - 48] for ch in str(agent_id)]
+            surf = pygame.Surface((sum(g.get_width() for g in glyphs),
+                                   max(g.get_height() for g in glyphs)), pygame.SRCALPHA)
+            x = 0
+            for glyph in glyphs:
+                surf.blit(glyph, (x, 0))
+                x += glyph.get_width()
+            self._id_surf_cache[key] = surf
+        return surf
+
+    def _get_agent_tile_surf(self, color, border_color, border_width):
+        """Returns the cached fused body+border template for an agent state."""
+        key = (color, border_color, border_width)
+        surf = self._agent_tile_cache.get(key)
+        if surf is None:
+            size = CELL_SIZE - 2 # Matches the old rect.inflate(-2, -2)
+            surf = pygame.Surface((size, size), pygame.SRCALPHA)
+            pygame.draw.rect(surf, color, (0, 0, size, size), border_radius=5)
+            pygame.draw.rect(surf, border_color, (0, 0, size, size), width=border_width, border_radius=5)
+            self._agent_tile_cache[key] = surf
+        return surf
+
+    def _get_bar_fill_surf(self, color):
+        """Returns the cached max-width bar fill template for a color."""
+        surf = self._bar_fill_cache.get(color)
+        if surf is None:
+            surf = pygame.Surface((self._hp_bar_bg.get_width(), 4))
+            surf.fill(color)
+            self._bar_fill_cache[color] = surf
+        return surf
+
+    def _compose_frame(self):
+        """Draws the entire simulation state onto the offscreen surface."""
         # --- Define surfaces ---
-        grid_surface = self.screen.subsurface(pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT - UI_AREA_HEIGHT))
-        panel_surface = self.screen.subsurface(pygame.Rect(SCREEN_WIDTH, 0, INFO_PANEL_WIDTH, SCREEN_HEIGHT))
+        grid_surface = self._render_surface.subsurface(pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT - UI_AREA_HEIGHT))
+        panel_surface = self._render_surface.subsurface(pygame.Rect(SCREEN_WIDTH, 0, INFO_PANEL_WIDTH, SCREEN_HEIGHT))
         # Make ui_surface cover the whole width for simplicity in coordinate handling now
-        ui_surface = self.screen.subsurface(pygame.Rect(0, SCREEN_HEIGHT - UI_AREA_HEIGHT, TOTAL_WINDOW_WIDTH, UI_AREA_HEIGHT))
+        ui_surface = self._render_surface.subsurface(pygame.Rect(0, SCREEN_HEIGHT - UI_AREA_HEIGHT, TOTAL_WINDOW_WIDTH, UI_AREA_HEIGHT))
 
         # --- Clear/fill surfaces ---
-        grid_surface.fill(COLOR_BLACK)
         panel_surface.fill(COLOR_PANEL_BG)
         ui_surface.fill(COLOR_BLACK) # Fill the whole bottom bar
 
         # --- Render Grid Surface ---
-        # Draw Grid Lines
-        for x in range(0, SCREEN_WIDTH, CELL_SIZE): pygame.draw.line(grid_surface, COLOR_GRID, (x, 0), (x, grid_surface.get_height()))
-        for y in range(0, grid_surface.get_height(), CELL_SIZE): pygame.draw.line(grid_surface, COLOR_GRID, (0, y), (SCREEN_WIDTH, y))
-
-        # --- VVV ADDED: Draw Axis Labels VVV ---
-        label_interval = 1 # Draw label every 5 cells
-        label_padding = 5  # Pixels padding from edge
-        label_color = COLOR_TEXT
+        # Blit the pre-rendered background (fill + grid lines + axis labels)
+        grid_surface.blit(self._grid_bg, (0, 0))
 
-        # Y-axis labels (Left edge)
-        for y_label in range(0, GRID_HEIGHT, label_interval):
-            # Only draw if label fits within grid height bounds
-            if (y_label * CELL_SIZE) < grid_surface.get_height():
-                label_text = str(y_label)
-                label_surf = self.font_small.render(label_text, True, label_color)
-                # Position slightly indented from left, vertically aligned with grid line
-                label_rect = label_surf.get_rect(topleft=(label_padding, y_label * CELL_SIZE + label_padding))
-                grid_surface.blit(label_surf, label_rect)
-
-        # X-axis labels (Top edge)
-        for x_label in range(0, GRID_WIDTH, label_interval):
-             # Only draw if label fits within grid width bounds
-            if (x_label * CELL_SIZE) < grid_surface.get_width():
-                label_text = str(x_label)
-                label_surf = self.font_small.render(label_text, True, label_color)
-                # Position slightly indented from top, horizontally aligned with grid line
-                label_rect = label_surf.get_rect(topleft=(x_label * CELL_SIZE + label_padding, label_padding))
-                grid_surface.blit(label_surf, label_rect)
-        # --- ^^^ ADDED: Draw Axis Labels ^^^ ---
+        # Running bbox of everything dynamic drawn on the grid this frame,
+        # for the dirty-rect present in _await_render.
+        gx0 = gy0 = 1 << 30; gx1 = gy1 = -1
 
         # Draw Resources with Quantity Text
-        for pos, res_info in self.resource_manager.resources.items():
-             # Check if coordinates are valid just in case
-             if not self.grid_manager.is_valid_coordinate(pos[0], pos[1]): continue
-
-             rect = pygame.Rect(pos[0] * CELL_SIZE, pos[1] * CELL_SIZE, CELL_SIZE, CELL_SIZE)
-
-             # Draw resource background based on quantity (same)
-             quantity = res_info.get('quantity', 0)
-             qty_ratio = min(1.0, quantity / RESOURCE_MAX_QUANTITY) if RESOURCE_MAX_QUANTITY > 0 else 1.0
+        # All per-deposit math (quantity ratio, brightness-scaled color, label
+        # key) runs vectorized over the manager's SoA arrays; the Python loop
+        # below only issues draw/blit calls.
+        res_positions, res_quantities = self.resource_manager.get_render_arrays()
+        if len(res_quantities):
+             if RESOURCE_MAX_QUANTITY > 0:
+                  qty_ratio = np.minimum(1.0, res_quantities / RESOURCE_MAX_QUANTITY)
+             else:
+                  qty_ratio = np.ones_like(res_quantities)
              # Make color brighter for higher quantity
-             intensity_color = tuple(int(c * (0.3 + qty_ratio * 0.7)) for c in COLOR_RESOURCE) # Brighter scale
-             pygame.draw.rect(grid_surface, intensity_color, rect.inflate(-4,-4), border_radius=3)
-
-             # --- VVV ADDED: Render Resource Quantity VVV ---
-             quantity_text = f"{int(round(quantity))}" # Display integer quantity
-             # Choose text color (e.g., black usually contrasts well with yellow)
-             qty_text_color = COLOR_BLACK
-             # Render using the small font
-             qty_surf = self.font_small.render(quantity_text, True, qty_text_color)
-             # Center the text within the resource rectangle
-             qty_rect = qty_surf.get_rect(center=rect.center)
-             # Blit the quantity text onto the grid surface, on top of the resource color
-             grid_surface.blit(qty_surf, qty_rect)
-             # --- ^^^ ADDED: Render Resource Quantity ^^^ ---
+             res_colors = (np.asarray(COLOR_RESOURCE) * (0.3 + qty_ratio[:, None] * 0.7)).astype(np.uint8).tolist()
+             res_pixels = (res_positions * CELL_SIZE).tolist()
+             qty_keys = np.clip(np.rint(res_quantities), 0, RESOURCE_MAX_QUANTITY).astype(np.int32).tolist()
+
+             half_cell = CELL_SIZE // 2
+             res_tile_rect = self._res_tile_rect # Reused in place; already inflated
+             for i, (px, py) in enumerate(res_pixels):
+                  if px < gx0: gx0 = px
+                  if py < gy0: gy0 = py
+                  if px + CELL_SIZE > gx1: gx1 = px + CELL_SIZE
+                  if py + CELL_SIZE > gy1: gy1 = py + CELL_SIZE
+                  res_tile_rect.x = px + 4; res_tile_rect.y = py + 4
+                  pygame.draw.rect(grid_surface, res_colors[i], res_tile_rect, border_radius=3)
+                  # Blit the pre-rendered quantity label centered in the cell
+                  qty_surf = self._qty_surf_cache[qty_keys[i]]
+                  grid_surface.blit(qty_surf, (px + half_cell - qty_surf.get_width() // 2,
+                                               py + half_cell - qty_surf.get_height() // 2))
 
         # --- Agent Drawing ---
-        agents_to_draw = self.agent_manager.get_all_agents() # Get current agents
-        for agent in agents_to_draw:
-            if not agent.is_alive(): continue # Skip dead agents
-
-            rect = pygame.Rect(agent.x * CELL_SIZE, agent.y * CELL_SIZE, CELL_SIZE, CELL_SIZE)
-
-            # Determine agent color (based on group or individual color)
+        # SoA snapshot: all pixel-coordinate math over the position arrays is
+        # done vectorized up front; the loop indexes precomputed lists.
+        agents_to_draw, agent_xs, agent_ys, hp_ratios, res_levels = self.agent_manager.get_render_arrays()
+        # Collect (template, pos) pairs and issue one batched blit after the
+        # loop - each pygame.draw call crosses the Python->C boundary, so
+        # ~7 calls per agent collapse to a single fblits (blits on older
+        # pygame) per frame.
+        blit_batch = getattr(grid_surface, 'fblits', grid_surface.blits)
+        agent_blits = []
+        bar_w = self._hp_bar_bg.get_width()
+        bar_dx = (CELL_SIZE - bar_w) // 2 # Centers the bar within the cell
+        radius_pixels = PERCEPTION_RADIUS * CELL_SIZE # Perception radius in pixels
+        # The whole numeric preamble (pixel coords, bar widths, HP buckets)
+        # runs in the layout kernel over the SoA arrays; the loop below just
+        # indexes the result lists.
+        hp_color_lut = self._hp_color_lut
+        (px_arr, py_arr, cx_arr, cy_arr,
+         hp_w_arr, res_w_arr, hp_b_arr) = _compute_render_layout(agent_xs, agent_ys, hp_ratios, res_levels,
+                                                                 CELL_SIZE, self._inv_max_res, bar_w)
+        agent_px = px_arr.tolist(); agent_py = py_arr.tolist()
+        agent_cx = cx_arr.tolist(); agent_cy = cy_arr.tolist()
+        hp_fill_ws = hp_w_arr.tolist(); res_fill_ws = res_w_arr.tolist()
+        hp_buckets = hp_b_arr.tolist()
+        # Cull anything outside the visible grid area up front - render cost
+        # then scales with visible agents, not total agents.
+        vis_rect = grid_surface.get_clip()
+        # Trail markers accumulate in the same pass (one iterator trip over
+        # the agents instead of two); they flush after the body batch so the
+        # layering - trails over bodies - is unchanged.
+        marker_size = CELL_SIZE // 4
+        marker_offset = (CELL_SIZE - marker_size) // 2 # Centers marker in its cell
+        trail_blits = []
+        rect = self._agent_rect # Scratch Rect, repositioned per agent
+        for i, agent in enumerate(agents_to_draw):
+            rect.x = agent_px[i]; rect.y = agent_py[i]
+
+            # --- VVV ADDED: Draw Agent Trails VVV ---
+            # Marker geometry is constant - only position and (quantized)
+            # color vary - so each point becomes a cached-stamp blit. Runs
+            # before the viewport cull: an off-screen agent can still have
+            # on-screen trail points.
+            if agent.visited_trail:
+                trail_len = len(agent.visited_trail)
+                agent_color = agent.color
+                markers = self._trail_marker_cache.get(agent_color)
+                if markers is None:
+                     # Interpolate the whole 16-step fade gradient for this color
+                     # in one vectorized op (replaces per-point interpolate_color).
+                     t = np.arange(16, dtype=np.float32)[:, None] / 15.0
+                     gradient = (np.asarray(agent_color, dtype=np.float32)[None, :] * (1.0 - t)
+                                 + self._trail_fade_arr[None, :] * t).astype(np.uint8).tolist()
+                     markers = []
+                     for trail_color in gradient:
+                          marker_surf = pygame.Surface((marker_size, marker_size), pygame.SRCALPHA)
+                          pygame.draw.rect(marker_surf, trail_color, (0, 0, marker_size, marker_size), border_radius=2)
+                          markers.append(marker_surf)
+                     self._trail_marker_cache[agent_color] = markers
+                # All per-point numeric work (bounds filtering, pixel math,
+                # fade buckets) runs in the njit kernel; the loop below only
+                # culls against the viewport and emits blit tuples.
+                trail_xy = np.array([pos for pos, timestamp in agent.visited_trail],
+                                    dtype=np.int32).reshape(trail_len, 2)
+                mxs, mys, mbuckets = _compute_trail_markers(trail_xy, GRID_WIDTH, GRID_HEIGHT,
+                                                            CELL_SIZE, marker_offset, 16)
+                for mx, my, bucket in zip(mxs.tolist(), mys.tolist(), mbuckets.tolist()):
+                     if vis_rect.collidepoint(mx, my): # Skip off-screen points
+                          trail_blits.append((markers[bucket], (mx, my)))
+                          if mx < gx0: gx0 = mx
+                          if my < gy0: gy0 = my
+                          if mx + marker_size > gx1: gx1 = mx + marker_size
+                          if my + marker_size > gy1: gy1 = my + marker_size
+            # --- ^^^ ADDED: Draw Agent Trails ^^^ ---
+
+            if not vis_rect.colliderect(rect): continue # Off-screen agent
+
+            # Determine agent color (based on group or individual color).
+            # group_colors mirrors the groups dict, so one .get replaces the
+            # get_group call + Group attribute access per agent per frame.
             agent_draw_color = agent.color # Default to agent's own assigned color
             if agent.group_id is not None:
-                group = self.group_manager.get_group(agent.group_id)
-                if group:
-                    agent_draw_color = group.color # Use group color if grouped
+                group_color = self.group_manager.group_colors.get(agent.group_id)
+                if group_color is not None:
+                    agent_draw_color = group_color # Use group color if grouped
                 else: # Fix inconsistent state if group disappeared
                     agent.group_id = None
                     # Keep agent's original color
 
-            # Calculate center coordinates in pixels
-            center_x = agent.x * CELL_SIZE + CELL_SIZE // 2
-            center_y = agent.y * CELL_SIZE + CELL_SIZE // 2
-            # Calculate radius in pixels (use the constant)
-            radius_pixels = PERCEPTION_RADIUS * CELL_SIZE
-            # Draw the circle outline (width=1)
-            # Note: This circle might extend beyond the grid surface bounds, Pygame handles clipping.
-            pygame.draw.circle(grid_surface, agent_draw_color, (center_x, center_y), radius_pixels, width=1)
+            # Center coordinates in pixels (precomputed above)
+            center_x = agent_cx[i]
+            center_y = agent_cy[i]
+            # Blit a cached per-color circle stamp instead of rasterizing the
+            # outline every frame. Agent draw colors are a small, stable set
+            # (agent palette + group colors), so the cache stays tiny.
+            circle_surf = self._perception_circle_cache.get(agent_draw_color)
+            if circle_surf is None:
+                size = radius_pixels * 2 + 2 # +2 so the width=1 outline isn't clipped
+                circle_surf = pygame.Surface((size, size), pygame.SRCALPHA)
+                pygame.draw.circle(circle_surf, agent_draw_color, (size // 2, size // 2), radius_pixels, width=1)
+                self._perception_circle_cache[agent_draw_color] = circle_surf
+            # Note: The stamp may extend beyond the grid surface bounds, Pygame handles clipping.
+            # Center the (square) stamp manually - get_rect would allocate a
+            # fresh Rect per agent.
+            circ_size = circle_surf.get_width()
+            circ_left = center_x - circ_size // 2
+            circ_top = center_y - circ_size // 2
+            grid_surface.blit(circle_surf, (circ_left, circ_top))
+            # The circle stamp contains the body/border/bars, so it stands in
+            # for the whole agent in the dirty bbox.
+            if circ_left < gx0: gx0 = circ_left
+            if circ_top < gy0: gy0 = circ_top
+            if circ_left + circ_size > gx1: gx1 = circ_left + circ_size
+            if circ_top + circ_size > gy1: gy1 = circ_top + circ_size
 
             # Determine border based on state (selected, combat, pending interaction)
             border_color = COLOR_WHITE ; border_width = 1 # Default border
@@ -464,76 +781,51 @@ class Simulation:
             elif agent.pending_group_request_to or agent.pending_group_requests_from: border_color = COLOR_RESOURCE; border_width = 2
             elif is_selected: border_color = COLOR_SELECTED_BORDER; border_width = 3
 
-            # Draw agent body background and border
-            pygame.draw.rect(grid_surface, agent_draw_color, rect.inflate(-2, -2), border_radius=5)
-            pygame.draw.rect(grid_surface, border_color, rect.inflate(-2,-2), width=border_width, border_radius=5)
+            # Queue the fused body+border template for this agent's state
+            agent_blits.append((self._get_agent_tile_surf(agent_draw_color, border_color, border_width),
+                                (rect.left + 1, rect.top + 1))) # inflate(-2, -2) origin
 
             # --- VVV ADDED: Render Agent ID VVV ---
-            id_text = str(agent.id)
-            # Choose a font (small font likely better) and color (e.g., black or white for contrast)
-            # Determine text color based on background brightness for better visibility
-            bg_lum = (0.299*agent_draw_color[0] + 0.587*agent_draw_color[1] + 0.114*agent_draw_color[2]) # Calculate luminance
-            text_color = COLOR_BLACK if bg_lum > 128 else COLOR_WHITE # Use black on light, white on dark
-
-            id_surf = self.font_small.render(id_text, True, text_color) # Use anti-aliasing (True)
-            # Center the ID text within the agent's rectangle
-            id_rect = id_surf.get_rect(center=rect.center)
-            # Blit the ID text onto the grid surface
-            grid_surface.blit(id_surf, id_rect)
+            # Choose text color based on background brightness for visibility;
+            # cached per draw color since the palette is small and stable.
+            text_color = self._text_color_cache.get(agent_draw_color)
+            if text_color is None:
+                bg_lum = (0.299*agent_draw_color[0] + 0.587*agent_draw_color[1] + 0.114*agent_draw_color[2]) # Calculate luminance
+                text_color = COLOR_BLACK if bg_lum > 128 else COLOR_WHITE # Use black on light, white on dark
+                self._text_color_cache[agent_draw_color] = text_color
+
+            id_surf = self._get_id_surf(agent.id, text_color) # Composited from cached digit glyphs
+            # Center the ID text within the agent's rectangle (manual math
+            # instead of a per-agent get_rect allocation)
+            agent_blits.append((id_surf, (center_x - id_surf.get_width() // 2,
+                                          center_y - id_surf.get_height() // 2)))
             # --- ^^^ ADDED: Render Agent ID ^^^ ---
 
-            # Draw HP bar (same logic as before)
-            hp_ratio = agent.hp / agent.max_hp
-            hp_bar_width = CELL_SIZE * 0.8; hp_bar_height = 4
-            hp_bar_x = rect.left + (CELL_SIZE - hp_bar_width) / 2
-            hp_bar_y = rect.top - hp_bar_height - 2
-            hp_bar_y = max(0, hp_bar_y) # Clamp to screen top
-            pygame.draw.rect(grid_surface, COLOR_BLACK, (hp_bar_x, hp_bar_y, hp_bar_width, hp_bar_height))
-            hp_color = COLOR_GROUP_START if hp_ratio > 0.5 else (COLOR_RESOURCE if hp_ratio > 0.2 else COLOR_GROUP_END)
-            pygame.draw.rect(grid_surface, hp_color, (hp_bar_x, hp_bar_y, hp_bar_width * hp_ratio, hp_bar_height))
+            # HP bar (above the cell, clamped to the screen top)
+            hp_bar_x = rect.left + bar_dx
+            hp_bar_y = max(0, rect.top - 4 - 2)
+            agent_blits.append((self._hp_bar_bg, (hp_bar_x, hp_bar_y)))
+            hp_color = hp_color_lut[hp_buckets[i]]
+            hp_fill_w = hp_fill_ws[i]
+            if hp_fill_w > 0:
+                 agent_blits.append((self._get_bar_fill_surf(hp_color).subsurface(0, 0, hp_fill_w, 4),
+                                     (hp_bar_x, hp_bar_y)))
 
             # --- VVV ADDED: Render Resource Bar VVV ---
-            res_bar_height = 4 # Height of the resource bar
-            res_bar_width = CELL_SIZE * 0.8 # Width similar to HP bar
-            res_bar_x = rect.left + (CELL_SIZE - res_bar_width) / 2
-            # Position resource bar at the BOTTOM INSIDE the agent rect
-            res_bar_y = rect.bottom - res_bar_height - 3 # Position near bottom edge, inside padding
-
-            # Calculate resource ratio (0.0 to 1.0)
-            # Ensure AGENT_MAX_RESOURCES is not zero to avoid division error
-            resource_ratio = 0.0
-            if AGENT_MAX_RESOURCES > 0:
-                 resource_ratio = max(0, min(1, agent.resource_level / AGENT_MAX_RESOURCES))
-
-            # Draw the background for the resource bar (e.g., dark grey)
-            res_bar_bg_color = (50, 50, 50)
-            pygame.draw.rect(grid_surface, res_bar_bg_color, (res_bar_x, res_bar_y, res_bar_width, res_bar_height))
-            # Draw the filled portion (use resource color - yellow)
-            filled_width = res_bar_width * resource_ratio
-            pygame.draw.rect(grid_surface, COLOR_RESOURCE, (res_bar_x, res_bar_y, filled_width, res_bar_height))
+            # Positioned at the bottom inside the agent rect
+            res_bar_y = rect.bottom - 4 - 3
+
+            agent_blits.append((self._res_bar_bg, (hp_bar_x, res_bar_y)))
+            res_fill_w = res_fill_ws[i]
+            if res_fill_w > 0:
+                 agent_blits.append((self._get_bar_fill_surf(COLOR_RESOURCE).subsurface(0, 0, res_fill_w, 4),
+                                     (hp_bar_x, res_bar_y)))
             # --- ^^^ ADDED: Render Resource Bar ^^^ ---
 
-        # --- VVV ADDED: Draw Agent Trails VVV ---
-        for agent in self.agent_manager.get_all_agents():
-            if not agent.visited_trail: continue # Skip if trail empty
-
-            trail_len = len(agent.visited_trail)
-            # Iterate through trail points with index for gradient calculation
-            for i, (pos, timestamp) in enumerate(agent.visited_trail):
-                 # Check if pos is valid just in case trail has old invalid coords
-                 if self.grid_manager.is_valid_coordinate(pos[0], pos[1]):
-                      fade_factor = 1 - i / trail_len # Linear fade based on position in deque
-                      # Interpolate between agent color and fade color
-                      trail_color = interpolate_color(agent.color, TRAIL_FADE_COLOR, fade_factor)
-
-                      # Draw a small rectangle or circle marker for the trail
-                      trail_rect = pygame.Rect(pos[0] * CELL_SIZE, pos[1] * CELL_SIZE, CELL_SIZE, CELL_SIZE)
-                      marker_size = CELL_SIZE // 4
-                      marker_rect = pygame.Rect(0, 0, marker_size, marker_size)
-                      marker_rect.center = trail_rect.center
-                      pygame.draw.rect(grid_surface, trail_color, marker_rect, border_radius=2)
-
-        # --- ^^^ ADDED: Draw Agent Trails ^^^ ---
+        if agent_blits:
+            blit_batch(agent_blits)
+        if trail_blits:
+            blit_batch(trail_blits) # After the bodies: trails render on top
 
         # --- Render Info Panel Surface ---
         if self.selected_agent_id is not None:
@@ -541,7 +833,7 @@ class Simulation:
              if agent: self._draw_agent_info_panel(panel_surface, agent) # Call helper to draw details
              else: self.selected_agent_id = None # Agent died or invalid ID, deselect
         else: # Draw placeholder text if no agent is selected
-            text_surf = self.font.render("Click agent to inspect", True, COLOR_TEXT)
+            text_surf = self._get_text_surf("Click agent to inspect", COLOR_TEXT, self.font)
             text_rect = text_surf.get_rect(center=(panel_surface.get_width() // 2, 30))
             panel_surface.blit(text_surf, text_rect)
 
@@ -563,7 +855,7 @@ class Simulation:
         pygame.draw.rect(ui_surface, color, button['rect'], border_radius=5)
 
         # Render button text centered within the button's relative rect
-        text_surf = self.font.render(button['text'], True, COLOR_BUTTON_TEXT)
+        text_surf = self._get_text_surf(button['text'], COLOR_BUTTON_TEXT, self.font)
         # text_rect's position is calculated relative to the button's rect (which is already relative to ui_surface)
         text_rect = text_surf.get_rect(center=button['rect'].center)
         # Blit the text onto the ui_surface using the calculated relative text_rect coordinates
@@ -571,23 +863,50 @@ class Simulation:
 
         # --- Draw Simulation Info Text ---
         info_y = UI_AREA_HEIGHT // 2 # Center text vertically
+        # FPS changes every frame but refreshing the readout every ~10 frames
+        # is plenty; the other slots only change once per tick.
+        self._fps_frame_counter += 1
+        if self._fps_frame_counter >= 10 or self._info_texts[3] is None:
+            self._fps_frame_counter = 0
+            fps_text = f"FPS: {self.clock.get_fps():.1f}"
+        else:
+            fps_text = self._info_texts[3]
         texts = [
             f"Tick: {self.time_step}",
             f"Agents: {len(self.agent_manager.agents)}",
             f"Groups: {len(self.group_manager.groups)}",
-            f"FPS: {self.clock.get_fps():.1f}"
+            fps_text
         ]
         # Start text relative to the button drawn on the ui_surface
         x_offset = button['rect'].right + 30
-        for text in texts:
-            text_surface = self.font.render(text, True, COLOR_TEXT)
+        for slot, text in enumerate(texts):
+            # Re-render a slot only when its text actually changed
+            if text != self._info_texts[slot]:
+                self._info_texts[slot] = text
+                self._info_surfs[slot] = self.font.render(text, True, COLOR_TEXT)
+            text_surface = self._info_surfs[slot]
             # Blit onto ui_surface using coordinates relative to ui_surface
             text_rect = text_surface.get_rect(midleft=(x_offset, info_y))
             ui_surface.blit(text_surface, text_rect)
             x_offset += text_surface.get_width() + 30
 
-        # --- Update the Full Display ---
-        pygame.display.flip()
+        # --- Publish dirty rects for the main-thread present ---
+        # Union this frame's grid bbox with last frame's so moved content
+        # gets erased on screen; the panel and UI strips redraw every frame.
+        grid_dirty = None
+        if gx1 >= 0:
+            grid_dirty = pygame.Rect(gx0, gy0, gx1 - gx0, gy1 - gy0).clip(grid_surface.get_rect())
+            if grid_dirty.width == 0 or grid_dirty.height == 0: grid_dirty = None
+        dirty = []
+        if grid_dirty is not None and self._prev_grid_dirty is not None:
+            dirty.append(grid_dirty.union(self._prev_grid_dirty))
+        elif grid_dirty is not None or self._prev_grid_dirty is not None:
+            dirty.append(grid_dirty or self._prev_grid_dirty)
+        self._prev_grid_dirty = grid_dirty
+        dirty.append(self._panel_rect)
+        dirty.append(self._ui_rect)
+        self._frame_dirty_rects = dirty
+        # (Presentation happens on the main thread in _await_render)
 
 
     def _draw_agent_info_panel(self, surface, agent):
@@ -598,9 +917,9 @@ class Simulation:
         panel_width = surface.get_width()
         padding = 10
 
-        plan_str = f"Plan: {agent.current_plan['plan'].name}"
-        if agent.current_plan['target'] is not None:
-             plan_str += f" (Tgt: {agent.current_plan['target']})"
+        plan_str = f"Plan: {agent.current_plan.plan.name}"
+        if agent.current_plan.target is not None:
+             plan_str += f" (Tgt: {agent.current_plan.target})"
         if agent.is_waiting_for_llm: plan_str += " [WAITING LLM]"
 
         # --- Agent Status ---
@@ -616,9 +935,15 @@ class Simulation:
             f"Requests From: {', '.join(map(str, agent.pending_group_requests_from)) if agent.pending_group_requests_from else 'None'}",
             f"Plan: {plan_str})"
         ]
+        # Collect (surface, pos) pairs and flush them in one batched call at
+        # the end - ~30 individual blit calls otherwise cross the Python->C
+        # boundary per frame while the panel is open.
+        panel_blits = []
         for line in info_lines:
-            text_surf = self.font.render(line, True, COLOR_TEXT)
-            surface.blit(text_surf, (padding, y_pos))
+            # Most lines only change when the agent's state does, so the
+            # glyph cache absorbs them; churny ones (HP) are bounded by the
+            # cache's eviction cap.
+            panel_blits.append((self._get_text_surf(line, COLOR_TEXT, self.font), (padding, y_pos)))
             y_pos += line_height
 
         # --- History Log ---
@@ -628,8 +953,8 @@ class Simulation:
         y_pos += 5
 
         # Log Title
-        title_surf = self.font.render("Recent History:", True, COLOR_WHITE)
-        surface.blit(title_surf, (padding, y_pos))
+        title_surf = self._get_text_surf("Recent History:", COLOR_WHITE, self.font)
+        panel_blits.append((title_surf, (padding, y_pos)))
         y_pos += line_height
 
         # Render Agent's Internal Log (most recent entries first)
@@ -638,13 +963,20 @@ class Simulation:
         max_log_lines_display = max(0, (surface.get_height() - log_start_y - padding) // small_line_height)
         num_entries_to_show = min(len(agent.history_log), max_log_lines_display)
 
-        # Iterate backwards through the deque to show most recent first
-        log_items_to_render = list(agent.history_log)[-num_entries_to_show:]
+        # Take just the tail of the deque - list(deque) would materialize the
+        # whole history only to throw most of it away.
+        log_start = max(0, len(agent.history_log) - num_entries_to_show)
+        log_items_to_render = list(islice(agent.history_log, log_start, None))
 
         for log_entry in log_items_to_render:
-             # Render with smaller font
-             log_surf = self.font_small.render(log_entry, True, COLOR_TEXT)
+             # Render with smaller font. History entries are immutable once
+             # logged and redraw at display FPS, so the glyph cache turns the
+             # per-frame TTF rasterization into a dict hit; its eviction cap
+             # bounds growth as the log scrolls.
+             log_surf = self._get_text_surf(log_entry, COLOR_TEXT, self.font_small)
              # Truncate if too long? For now, let it wrap if Pygame supports it (it doesn't automatically)
              # Simple solution: Blit as is, might overflow panel width if very long.
-             surface.blit(log_surf, (padding + 5, y_pos)) # Indent log entries
-             y_pos += small_line_height
\ No newline at end of file
+             panel_blits.append((log_surf, (padding + 5, y_pos))) # Indent log entries
+             y_pos += small_line_height
+
+        getattr(surface, 'fblits', surface.blits)(panel_blits)
\ No newline at end of file